@@ -1,31 +1,49 @@
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
 from config import Config
+from app.cache import TTLCache
+from app.hashing import PasswordHasher
+from app.routing import RoutingSQLAlchemy
 import os
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 migrate = Migrate()
 bcrypt = Bcrypt()
+hasher = PasswordHasher(bcrypt)
 jwt = JWTManager()
+revocation_cache = TTLCache()
+user_cache = TTLCache()
 
 def create_app(config=Config):
     """Create the application instance"""
 
     # config files are relative to the instance folder
     app = Flask(__name__, instance_relative_config=True)
-    app.config.from_object(Config)
+    app.config.from_object(config)
 
     db.init_app(app)
     migrate.init_app(app, db)
     bcrypt.init_app(app)
+    hasher.init_app(app)
     jwt.init_app(app)
+    revocation_cache.init_app(app, 'REVOCATION_CACHE')
+    user_cache.init_app(app, 'USER_CACHE')
 
     from app.api import bp
     app.register_blueprint(bp, url_prefix='/api')
 
+    from app import cli, metrics, profiling, scheduler
+    from app.helpers import token_writer
+    cli.init_app(app)
+    metrics.init_app(app)
+    metrics.register_cache('revocation', revocation_cache)
+    metrics.register_cache('user', user_cache)
+    profiling.init_app(app)
+    scheduler.init_app(app)
+    token_writer.init_app(app)
+
     @app.route('/')
     def index():
         return 'API is live! - documentation'
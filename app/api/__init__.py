@@ -4,9 +4,10 @@ from flask_restful import Api
 bp = Blueprint('one-acre', __name__)
 api = Api(bp)
 
-from .farms import FarmAPI
-from .auth import SignUP, SignIn, RefreshToken
+from .farms import FarmAPI, FarmBulkAPI, FarmExport, FarmStats
+from .auth import SignUP, SignIn, RefreshToken, SignOut, SignOutRefresh
 from .tokens import Tokens
+from .metrics import Metrics
 
 # routes for farm resource
 api.add_resource(
@@ -16,6 +17,18 @@ api.add_resource(
     '/farms/<id>/<field>',
     endpoint='farm'
     )
+api.add_resource(
+    FarmBulkAPI,
+    '/farms/bulk',
+    )
+api.add_resource(
+    FarmExport,
+    '/farms/export',
+    )
+api.add_resource(
+    FarmStats,
+    '/farms/stats',
+    )
 # Authenticaion routes
 api.add_resource(
         SignUP,
@@ -32,8 +45,24 @@ api.add_resource(
         '/auth/refresh',
         )
 
+api.add_resource(
+        SignOut,
+        '/auth/logout',
+        )
+
+api.add_resource(
+        SignOutRefresh,
+        '/auth/logout/refresh',
+        )
+
 api.add_resource(
         Tokens,
         '/auth/tokens',
         '/auth/tokens/<token_id>'
         )
+
+# Prometheus metrics, for admins
+api.add_resource(
+        Metrics,
+        '/metrics',
+        )
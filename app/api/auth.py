@@ -7,28 +7,37 @@ Authentication
 """
 
 from flask_jwt_extended import (
-    create_access_token, get_raw_jwt, jwt_required, create_refresh_token,
-    get_jwt_identity, jwt_refresh_token_required
+    get_raw_jwt, jwt_required, get_jwt_identity, jwt_refresh_token_required
 )
-from flask_restful import Resource, reqparse
+from flask_restful import Resource
 from flask import current_app
 from app.models import User
 from app import db
+from app.exceptions import HashingBusy
 from app.helpers import (
-    is_token_revoked, add_token_to_database, get_user_tokens,
-    revoke_token, unrevoke_token,
+    is_token_revoked, get_user_tokens,
+    revoke_token, unrevoke_token, revoke_decoded_token, issue_tokens,
 )
 from .common.utils import (valid_email, valid_password)
 from .common.errors import raise_error
+from .common.schemas import Schema
+
+CREDENTIALS_SCHEMA = Schema([('email', str), ('password', str)])
+
+
+def hashing_busy():
+    """
+    Response for when the password hashing pool is full
+    """
+    response = raise_error(503, "Server is busy, please try again shortly")
+    response.headers['Retry-After'] = '1'
+    return response
 
-parser = reqparse.RequestParser()
-parser.add_argument('email', type=str) 
-parser.add_argument('password', type=str)
 
 class SignUP(Resource):
 
     def post(self):
-        args = parser.parse_args()
+        args = CREDENTIALS_SCHEMA.parse()
         email = args.get('email')
         password = args.get('password') 
 
@@ -51,23 +60,22 @@ class SignUP(Resource):
             return raise_error(400, "User already exists")
 
         user = User(email=email)
-        user.set_password(password)
-
+        try:
+            user.set_password(password)
+        except HashingBusy:
+            return hashing_busy()
+
+        # Create our JWTs and store them, not revoked, in the same
+        # transaction as the new user
+        access_token, refresh_token = issue_tokens(email)
         db.session.add(user)
-        db.session.commit()
-
-        # Create our JWTs
-        access_token = create_access_token(identity=email)
-        refresh_token = create_refresh_token(identity=email)
-
-        # Store the tokens in our store with a status of not currently revoked.
-        add_token_to_database(access_token, current_app.config['JWT_IDENTITY_CLAIM'])
-        add_token_to_database(refresh_token, current_app.config['JWT_IDENTITY_CLAIM'])
+        db.session.flush()
 
         data = {}
         data['access_token'] = access_token
         data['refresh_token'] = refresh_token
         data['user'] = user.serialize
+        db.session.commit()
 
         response = {
                 "status": 201,
@@ -80,7 +88,7 @@ class SignUP(Resource):
 class SignIn(Resource):
 
     def post(self):
-        args = parser.parse_args()
+        args = CREDENTIALS_SCHEMA.parse()
         email = args.get('email', None)
         password = args.get('password', None)
 
@@ -90,21 +98,29 @@ class SignIn(Resource):
             return raise_error(400, "Missing 'password' in body")
 
         user = User.query.filter_by(email=email).first()
-        if user is None or not user.check_password(password):
-            return raise_error(401, "Bad email or password")
-        
-        # Create our JWTs
-        access_token = create_access_token(identity=email)
-        refresh_token = create_refresh_token(identity=email)
-
-        # Store the tokens in our store with a status of not currently revoked.
-        add_token_to_database(access_token,current_app.config['JWT_IDENTITY_CLAIM'])
-        add_token_to_database(refresh_token,current_app.config['JWT_IDENTITY_CLAIM'])
+        try:
+            if user is None or not user.check_password(password):
+                return raise_error(401, "Bad email or password")
+        except HashingBusy:
+            return hashing_busy()
+
+        # Upgrade the stored hash when the configured cost has changed. This
+        # is best effort; it is retried on a later login if the pool is full.
+        if user.password_needs_rehash:
+            try:
+                user.set_password(password)
+            except HashingBusy:
+                pass
+
+        # Create our JWTs and store them, not revoked, committing them with
+        # any rehash in one transaction
+        access_token, refresh_token = issue_tokens(email)
 
         data = {}
         data['access_token'] = access_token
         data['refresh_token'] = refresh_token
         data['user'] = user.serialize
+        db.session.commit()
 
         response = {
                 "status": 200,
@@ -126,11 +142,35 @@ class RefreshToken(Resource):
         Returns a new access token
         """
         current_user = get_jwt_identity()
-        new_token = create_access_token(identity=current_user)
-        add_token_to_database(new_token, current_app.config['JWT_IDENTITY_CLAIM'])
+        new_token, _ = issue_tokens(current_user, refresh=False)
+        db.session.commit()
 
         return {
             'status': 200,
             'data': [{'access_token': new_token
                      }]
             }
+
+
+class SignOut(Resource):
+    """
+    Revokes the access token used to make the request
+    """
+
+    @jwt_required
+    def post(self):
+        revoke_decoded_token(get_raw_jwt(),
+                             current_app.config['JWT_IDENTITY_CLAIM'])
+        return {'status': 200, 'message': "Access token successfully revoked"}
+
+
+class SignOutRefresh(Resource):
+    """
+    Revokes the refresh token used to make the request
+    """
+
+    @jwt_refresh_token_required
+    def post(self):
+        revoke_decoded_token(get_raw_jwt(),
+                             current_app.config['JWT_IDENTITY_CLAIM'])
+        return {'status': 200, 'message': "Refresh token successfully revoked"}
@@ -0,0 +1,31 @@
+"""
+app.api.common.etags
+~~~~~~~~~~~~~~~~~~~~~
+
+Strong ETags and conditional GET support
+
+"""
+import hashlib
+
+from flask import Response, request
+
+
+def make_etag(*parts):
+    """
+    Returns a strong ETag for a representation identified by the given parts
+    (e.g. a resource id and version) and the current request's query string,
+    which selects the representation
+    """
+    key = '/'.join(str(part) for part in parts)
+    key = key + '?' + request.query_string.decode('utf-8', 'replace')
+    return '"{}"'.format(hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+
+def not_modified(etag):
+    """
+    Returns a 304 response if the client already holds the representation
+    with the given ETag, otherwise None
+    """
+    if request.if_none_match.contains(etag.strip('"')):
+        return Response(status=304, headers={'ETag': etag})
+    return None
@@ -0,0 +1,69 @@
+"""
+app.api.common.filtering
+~~~~~~~~~~~~~~~~~~~~~~~~~
+
+JSON:API ``filter[...]`` and ``sort`` query parameters for collection
+endpoints. Only filters and sort fields that the endpoint declares (and has
+indexes for) are accepted; anything else is rejected rather than turned into
+a full table scan.
+"""
+from flask import request
+
+from app.exceptions import InvalidQueryParameter
+
+
+def boolean(value):
+    if value == 'true':
+        return True
+    if value == 'false':
+        return False
+    raise ValueError(value)
+
+
+def apply_filters(query, filters):
+    """
+    Adds a WHERE clause to query for every ``filter[name]=value`` parameter
+    of the current request.
+
+    :param filters: dict mapping filter names to ``(column, convert)`` pairs,
+                    where convert turns the raw value into the column's type
+                    and raises ValueError for bad values, or to functions
+                    taking the query and the raw value and returning the
+                    filtered query
+    """
+    for key, value in request.args.items(multi=True):
+        if not key.startswith('filter['):
+            continue
+        name = key[len('filter['):-1] if key.endswith(']') else key
+        if name not in filters:
+            raise InvalidQueryParameter(
+                "Filtering on '{}' is not supported".format(name))
+        if callable(filters[name]):
+            query = filters[name](query, value)
+            continue
+        column, convert = filters[name]
+        try:
+            value = convert(value)
+        except ValueError:
+            raise InvalidQueryParameter("Invalid value for {}".format(key))
+        query = query.filter(column == value)
+    return query
+
+
+def sort_keys(fields, default, tiebreaker):
+    """
+    Returns the ``(column, descending)`` keys the collection should be
+    ordered by, following the ``sort`` parameter of the current request.
+    A leading '-' sorts in descending order. tiebreaker is a unique column
+    appended to make the ordering total.
+    """
+    sort = request.args.get('sort', default)
+    if ',' in sort:
+        raise InvalidQueryParameter("Sorting on more than one field is "
+                                    "not supported")
+    descending = sort.startswith('-')
+    name = sort[1:] if descending else sort
+    if name not in fields:
+        raise InvalidQueryParameter(
+            "Sorting on '{}' is not supported".format(name))
+    return [(fields[name], descending), (tiebreaker, descending)]
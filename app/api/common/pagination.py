@@ -0,0 +1,169 @@
+"""
+app.api.common.pagination
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Keyset (cursor) pagination for collection endpoints
+
+Pages are requested with the JSON:API ``page[size]``, ``page[after]`` and
+``page[before]`` query parameters. Cursors are opaque to clients and encode
+the sort key values of the row a page starts after (or ends before), so a
+page is always a single indexed range scan however deep into the collection
+it is.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from urllib.parse import urlencode
+
+from flask import current_app, request
+from sqlalchemy import and_, or_
+from sqlalchemy.types import DateTime
+
+from app.exceptions import InvalidQueryParameter
+
+CURSOR_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def encode_cursor(values):
+    values = [value.strftime(CURSOR_DATE_FORMAT)
+              if isinstance(value, datetime) else value for value in values]
+    payload = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def _key_value(column, value):
+    """
+    Returns a decoded cursor value as a value of column's type, raising
+    ValueError when it is not one
+    """
+    if isinstance(column.type, DateTime):
+        return datetime.strptime(value, CURSOR_DATE_FORMAT)
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        # untyped expressions, such as SQLite's bm25 rank, are numbers
+        python_type = float
+    # JSON true and false are also ints to isinstance
+    if isinstance(value, bool) != (python_type is bool):
+        raise ValueError(value)
+    if python_type is float and isinstance(value, int):
+        return float(value)
+    if not isinstance(value, python_type):
+        raise ValueError(value)
+    return value
+
+
+def decode_cursor(cursor, keys):
+    """
+    Returns the key values encoded in cursor, converted back to the types of
+    the key columns
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded).decode('utf-8'))
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError(cursor)
+        return [_key_value(column, value)
+                for (column, _), value in zip(keys, values)]
+    except (ValueError, TypeError, binascii.Error):
+        raise InvalidQueryParameter("Invalid page cursor")
+
+
+def _page_size():
+    default = current_app.config['PAGE_SIZE']
+    maximum = current_app.config['MAX_PAGE_SIZE']
+    size = request.args.get('page[size]')
+    if size is None:
+        return min(default, maximum)
+    if not size.isdigit() or int(size) < 1:
+        raise InvalidQueryParameter("page[size] should be a positive integer")
+    return min(int(size), maximum)
+
+
+def _beyond(keys, values, backwards=False):
+    """
+    Builds the condition for rows that sort after the given key values (or
+    before them when going backwards)
+    """
+    clauses = []
+    for i, (column, descending) in enumerate(keys):
+        if descending != backwards:
+            comparison = column < values[i]
+        else:
+            comparison = column > values[i]
+        equal = [keys[j][0] == values[j] for j in range(i)]
+        clauses.append(and_(*(equal + [comparison])))
+    return or_(*clauses)
+
+
+def _ordering(keys, backwards=False):
+    return [column.desc() if descending != backwards else column.asc()
+            for column, descending in keys]
+
+
+def _page_url(**cursor):
+    args = [(key, value) for key, value in request.args.items(multi=True)
+            if key not in ('page[after]', 'page[before]')]
+    args.extend(sorted(cursor.items()))
+    return request.base_url + '?' + urlencode(args)
+
+
+class Page(object):
+    """
+    One page of a collection along with its JSON:API pagination links
+    """
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def links(self):
+        return {
+            'self': request.url,
+            'next': self.next_cursor and _page_url(
+                **{'page[after]': self.next_cursor}),
+            'prev': self.prev_cursor and _page_url(
+                **{'page[before]': self.prev_cursor}),
+        }
+
+
+def paginate(query, keys):
+    """
+    Returns the page of query requested by the current request's page
+    parameters.
+
+    :param keys: list of ``(column, descending)`` pairs the collection is
+                 ordered by. The last key must be unique (e.g. the primary
+                 key) so that every row has a distinct cursor.
+    """
+    size = _page_size()
+    after = request.args.get('page[after]')
+    before = request.args.get('page[before]')
+    if after and before:
+        raise InvalidQueryParameter(
+            "Only one of page[after] and page[before] may be given")
+
+    backwards = bool(before)
+    cursor = before or after
+    if cursor:
+        query = query.filter(
+            _beyond(keys, decode_cursor(cursor, keys), backwards))
+    rows = query.order_by(*_ordering(keys, backwards)).limit(size + 1).all()
+    has_more = len(rows) > size
+    rows = rows[:size]
+    if backwards:
+        rows.reverse()
+    if not rows:
+        return Page(rows)
+
+    def key_of(row):
+        return encode_cursor([getattr(row, column.key) for column, _ in keys])
+
+    more_before = has_more if backwards else bool(cursor)
+    more_after = bool(cursor) if backwards else has_more
+    return Page(rows,
+                next_cursor=more_after and key_of(rows[-1]) or None,
+                prev_cursor=more_before and key_of(rows[0]) or None)
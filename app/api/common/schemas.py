@@ -0,0 +1,99 @@
+"""
+app.api.common.schemas
+~~~~~~~~~~~~~~~~~~~~~~
+
+Request payload schemas
+
+A Schema declares the fields of a payload once, at import, in place of a
+reqparse.RequestParser, and reads a request in one pass over its JSON body
+and then its query string and form values. Results are those of the
+RequestParser with type= and the default locations: the first value given
+for a field wins, the first item of a JSON array stands for the array, and
+values other than null are converted with the field's type.
+"""
+from flask import request
+
+from app.exceptions import InvalidPayload
+
+MISSING_MESSAGE = ("Missing required parameter in the JSON body or the post "
+                   "body or the query string")
+
+
+def _json_items(body):
+    for name, value in body.items():
+        if isinstance(value, (list, tuple)):
+            if not value:
+                continue
+            value = value[0]
+        yield name, value
+
+
+class Schema(object):
+    """
+    The fields of a request payload
+
+    :param fields: (name, type) pairs. The type is called with the given
+                   value unless it is None, as reqparse's type=str or
+                   type=bool
+    :param required: names of the fields that must be given
+    :param strict: whether fields not declared are an error
+    """
+
+    def __init__(self, fields, required=(), strict=False):
+        self.fields = tuple(fields)
+        self.types = dict(self.fields)
+        self.required = tuple(required)
+        self.strict = strict
+
+    def _collect(self, items, found, unknown):
+        types = self.types
+        for name, value in items:
+            if name in types:
+                if name not in found:
+                    found[name] = value
+            elif self.strict and name not in unknown:
+                unknown.append(name)
+
+    def _convert(self, found, unknown):
+        if unknown:
+            raise InvalidPayload('Unknown arguments: {}'.format(
+                ', '.join(unknown)))
+        for name in self.required:
+            if name not in found:
+                raise InvalidPayload(MISSING_MESSAGE)
+        values = {}
+        for name, type_ in self.fields:
+            value = found.get(name)
+            if value is not None:
+                try:
+                    value = type_(value)
+                except (TypeError, ValueError) as e:
+                    raise InvalidPayload(str(e))
+            values[name] = value
+        return values
+
+    def parse(self):
+        """
+        Returns the fields of the current request as a dict with every
+        declared field, None when not given. Raises InvalidPayload for
+        missing required or unknown fields, and BadRequest for a malformed
+        JSON body.
+        """
+        found = {}
+        unknown = []
+        body = request.get_json()
+        if isinstance(body, dict):
+            self._collect(_json_items(body), found, unknown)
+        self._collect(request.values.items(multi=True), found, unknown)
+        return self._convert(found, unknown)
+
+    def load(self, mapping):
+        """
+        Returns the fields of a dict, such as one item of a batch payload,
+        in the same way as parse. Values are converted as they are, arrays
+        included.
+        """
+        found = {}
+        unknown = []
+        self._collect(mapping.items(), found, unknown)
+        return self._convert(found, unknown)
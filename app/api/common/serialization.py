@@ -0,0 +1,206 @@
+"""
+app.api.common.serialization
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+JSON encoding of API responses and a columnar serialization path for
+collections
+
+Collection pages and exports are encoded as compact UTF-8 JSON, with orjson
+when it is installed and the json module otherwise; other responses keep
+flask-restful's encoding. Both encoders give the same bytes for the same
+data: where they would differ (floats in exponent notation, non-finite floats,
+integers beyond 64 bits) the json module is used.
+
+Collections are not built from ORM instances. A ColumnSerializer selects only
+the columns a resource's ``serialize`` reads, as plain rows, and builds the
+same dicts from them, formatting dates once per distinct day. JSON:API sparse
+fieldsets (``fields[type]=a,b``) narrow the selected columns further.
+"""
+import json
+import math
+import re
+
+from flask import current_app, make_response, request
+from flask_restful.representations import json as restful_json
+
+from app import db
+from app.exceptions import InvalidQueryParameter
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# Numbers the two encoders write differently: orjson writes 1e+16 as 1e16
+_EXPONENT = re.compile(rb'[0-9]e[-0-9]')
+
+_TIME_FORMAT = ' %H:%M %p'
+
+
+def _finite(data):
+    """
+    Returns data with non-finite floats replaced by None, as orjson writes
+    them
+    """
+    if isinstance(data, float):
+        return data if math.isfinite(data) else None
+    if isinstance(data, dict):
+        return {key: _finite(value) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [_finite(value) for value in data]
+    return data
+
+
+def _stdlib_dumps(data):
+    try:
+        dumped = json.dumps(data, ensure_ascii=False, separators=(',', ':'),
+                            allow_nan=False)
+    except ValueError:
+        dumped = json.dumps(_finite(data), ensure_ascii=False,
+                            separators=(',', ':'))
+    return dumped.encode('utf-8')
+
+
+def dumps(data):
+    """
+    Encodes data as compact JSON and returns the UTF-8 bytes
+    """
+    if orjson is not None:
+        try:
+            dumped = orjson.dumps(data)
+        except orjson.JSONEncodeError:
+            pass
+        else:
+            if _EXPONENT.search(dumped) is None:
+                return dumped
+    return _stdlib_dumps(data)
+
+
+def json_response(data, code, headers=None):
+    """
+    Returns a compact JSON response of data, for the large documents of the
+    collection paths. Debug mode keeps flask-restful's indented output.
+    """
+    if current_app.debug or current_app.config.get('RESTFUL_JSON'):
+        response = restful_json.output_json(data, code, headers)
+    else:
+        response = make_response(dumps(data) + b'\n', code)
+        response.headers.extend(headers or {})
+    response.headers['Content-Type'] = 'application/json'
+    return response
+
+
+def _date_formatter(date_format):
+    """
+    Returns a function formatting datetimes (or None) with date_format. A
+    listing holds few distinct days, so values are formatted once per day:
+    the time of day of the models' '... %H:%M %p' formats is filled in per
+    value and any other format is memoized per value.
+    """
+    formatted = {}
+    if date_format.endswith(_TIME_FORMAT):
+        day_format = date_format[:-len(_TIME_FORMAT)]
+
+        def format_value(value):
+            if value is None:
+                return None
+            day = value.date()
+            prefix = formatted.get(day)
+            if prefix is None:
+                prefix = formatted[day] = day.strftime(day_format)
+            return '%s %02d:%02d %s' % (prefix, value.hour, value.minute,
+                                        'AM' if value.hour < 12 else 'PM')
+    else:
+        def format_value(value):
+            if value is None:
+                return None
+            text = formatted.get(value)
+            if text is None:
+                text = formatted[value] = value.strftime(date_format)
+            return text
+    return format_value
+
+
+class ColumnSerializer(object):
+    """
+    Serializes query rows of selected columns into dicts, one column at a
+    time.
+
+    :param fields: list of ``(name, column)`` or ``(name, column, format)``
+                   tuples in the order of the keys of the dicts; format is
+                   the strftime format of a DateTime column
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.names = [field[0] for field in fields]
+        self.columns = [field[1] for field in fields]
+        self.formats = [field[2] if len(field) > 2 else None
+                        for field in fields]
+
+    def only(self, names):
+        """
+        Returns a serializer for the named fields alone
+        """
+        return ColumnSerializer([field for field in self.fields
+                                 if field[0] in names])
+
+    def query(self, *extra):
+        """
+        Returns a query of the serialized columns followed by those of the
+        extra columns (e.g. sort keys) that are not among them
+        """
+        columns = list(self.columns)
+        for column in extra:
+            if not any(column is selected for selected in columns):
+                columns.append(column)
+        return db.session.query(*columns)
+
+    def serialize(self, rows):
+        """
+        Returns the list of dicts for rows, which hold one value per column.
+        Values of extra columns after the serialized ones are left out.
+        """
+        if not rows:
+            return []
+        columns = list(zip(*rows))
+        for i, date_format in enumerate(self.formats):
+            if date_format is not None:
+                columns[i] = map(_date_formatter(date_format), columns[i])
+        names = self.names
+        return [dict(zip(names, values)) for values in zip(*columns)]
+
+
+def sparse_fieldset(serializer, type_name, keep=()):
+    """
+    Returns serializer narrowed to the fields requested with the current
+    request's JSON:API ``fields[type_name]`` parameter, or serializer itself
+    if there is none. The id is always included, as are the fields in keep,
+    such as the keys of included relationships.
+    """
+    parameter = 'fields[{}]'.format(type_name)
+    value = request.args.get(parameter)
+    if value is None:
+        return serializer
+    names = [name for name in value.split(',') if name]
+    for name in names:
+        if name not in serializer.names:
+            raise InvalidQueryParameter(
+                "Unknown field '{}' in {}".format(name, parameter))
+    return serializer.only(['id'] + names + list(keep))
+
+
+def requested_includes(supported):
+    """
+    Returns the set of relationships requested with the current request's
+    JSON:API ``include`` parameter, all of which must be in supported
+    """
+    value = request.args.get('include')
+    if not value:
+        return set()
+    names = set(value.split(','))
+    for name in sorted(names):
+        if name not in supported:
+            raise InvalidQueryParameter(
+                "Including '{}' is not supported".format(name))
+    return names
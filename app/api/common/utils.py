@@ -9,8 +9,7 @@ import string
 import datetime
 from flask import jsonify
 from app import jwt
-from app.helpers import is_token_revoked
-from app.models import User
+from app.helpers import is_token_revoked, get_user_by_email
 
 EMAIL_PATTERN = re.compile(r".+@[\w]+\.[\w]")
 
@@ -38,10 +37,25 @@ def valid_date(date):
 def valid_margin(margin):
     try:
         margin = float(margin)
-    except ValueError:
-        units = None
+    except (TypeError, ValueError):
+        margin = None
     return margin
 
+def valid_coordinate(value, limit):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not -limit <= value <= limit:
+        return None
+    return value
+
+def valid_latitude(latitude):
+    return valid_coordinate(latitude, 90)
+
+def valid_longitude(longitude):
+    return valid_coordinate(longitude, 180)
+
 def valid_farm_stage(value):
     if value in ('open', 'closed'):
         return value.strip()
@@ -63,17 +77,23 @@ def valid_units(units):
         units = None
     return units
 
+PUNCTUATION = frozenset(string.punctuation)
+
 def valid_password(password):
+    # at least 5 characters with a special character and a digit, checked
+    # in one pass that stops as soon as both have been seen
+    if len(password) < 5:
+        return None
     special_char_present = False
-    for char in password:
-        if char in string.punctuation:
-            special_char_present = special_char_present or True
     digit_present = False
     for char in password:
-        digit_present = digit_present or char.isdigit()
-
-    if special_char_present and digit_present:
-        if len(password) >= 5:
+        if char in PUNCTUATION:
+            special_char_present = True
+        elif char.isdigit():
+            digit_present = True
+        else:
+            continue
+        if special_char_present and digit_present:
             return True
 
 # Define our callback function to check if a token has been revoked or not
@@ -83,5 +103,4 @@ def check_if_token_revoked(decoded_token):
 
 @jwt.user_loader_callback_loader
 def load_user(identity):
-    user = User.query.filter_by(email=identity).first()
-    return user
+    return get_user_by_email(identity)
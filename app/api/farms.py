@@ -3,52 +3,275 @@ app.api.farms
 ~~~~~~~~~~~~~~~~~
 
 """
+from datetime import datetime
 
-from flask_restful import Resource, reqparse, url_for
+from flask import Response, current_app, request, stream_with_context
+from flask_restful import Resource, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity, current_user
-from app.models import Farm
+from werkzeug.exceptions import BadRequest
+from app.models import Farm, User
 from app import db
+from app.exceptions import InvalidPayload, InvalidQueryParameter
+from app.helpers import bump_change_counter, get_change_counter
+from app.geo import encode, squared_distance, within
+from app.search import match_farms, search_rank
+from app.stats import (
+    STAT_FIELDS, count_farms, farm_stat_values, get_farm_stats
+)
 from .common.errors import raise_error
+from .common.etags import make_etag, not_modified
+from .common.filtering import apply_filters, boolean, sort_keys
+from .common.pagination import paginate
+from .common.schemas import Schema
+from .common.serialization import (
+    ColumnSerializer, dumps, json_response, requested_includes, sparse_fieldset
+)
 from .common.utils import (
     valid_farm_name, valid_location, valid_description, valid_units,
     valid_active_status, valid_margin, valid_farm_stage, valid_location, 
-    valid_date
+    valid_date, valid_latitude, valid_longitude
 )
 
-parser = reqparse.RequestParser()
-parser.add_argument('name', type=str)
-parser.add_argument('location', type=str)
-parser.add_argument('description', type=str)
-parser.add_argument('units', type=str)
-parser.add_argument('farm_stage', type=str)
+FARM_SCHEMA = Schema([
+    ('name', str),
+    ('location', str),
+    ('description', str),
+    ('units', str),
+    ('farm_stage', str),
+    ('latitude', str),
+    ('longitude', str),
+])
+
+
+def near_point():
+    """
+    Returns the latitude, longitude and radius in km of the current
+    request's filter[near]=latitude,longitude and filter[radius] parameters
+    """
+    try:
+        latitude, longitude = request.args['filter[near]'].split(',')
+    except ValueError:
+        latitude = longitude = None
+    latitude = valid_latitude(latitude)
+    longitude = valid_longitude(longitude)
+    if latitude is None or longitude is None:
+        raise InvalidQueryParameter("Invalid value for filter[near]")
+    radius = request.args.get('filter[radius]',
+                              current_app.config['GEO_DEFAULT_RADIUS'])
+    try:
+        radius = float(radius)
+    except ValueError:
+        radius = None
+    max_radius = current_app.config['GEO_MAX_RADIUS']
+    if radius is None or not 0 < radius <= max_radius:
+        raise InvalidQueryParameter("filter[radius] should be a distance in "
+                                    "km of at most {}".format(max_radius))
+    return latitude, longitude, radius
+
+
+def filter_near(query, value):
+    return query.filter(within(*near_point()))
+
+
+def filter_radius(query, value):
+    # the radius is applied by filter_near
+    if 'filter[near]' not in request.args:
+        raise InvalidQueryParameter("filter[radius] needs filter[near]")
+    return query
+
+
+# Filters and sort fields supported on the collection. Each filter has a
+# (column, createdon) index and each sort field an index of its own; ties are
+# broken on id so that keyset pages are well defined. filter[q] is a full-text
+# search, whose results can also be sorted by relevance. filter[near] (with
+# filter[radius]) finds farms around a point through the geohash index, and
+# its results can be sorted by distance.
+FILTERS = {
+    'location': (Farm.location, str),
+    'stage': (Farm.stage, str),
+    'active': (Farm.active, boolean),
+    'owner': (Farm.user_id, int),
+    'q': match_farms,
+    'near': filter_near,
+    'radius': filter_radius,
+}
+SORT_FIELDS = {
+    'createdon': Farm.createdon,
+    'name': Farm.name,
+}
+
+# The columns of Farm.serialize, for reading collections as plain rows
+FARM_COLUMNS = ColumnSerializer([
+    ('id', Farm.id),
+    ('name', Farm.name),
+    ('location', Farm.location),
+    ('latitude', Farm.latitude),
+    ('longitude', Farm.longitude),
+    ('units', Farm.units),
+    ('active', Farm.active),
+    ('harvest_time', Farm.harvest_time, '%a, %d %b %Y'),
+    ('margin', Farm.margin),
+    ('stage', Farm.stage),
+    ('description', Farm.description),
+    ('createdon', Farm.createdon, '%a, %d %b %Y %H:%M %p'),
+    ('createdby', Farm.user_id),
+])
+
+# Column defaults of the farms a bulk create writes, also used for their
+# statistics and the response
+BULK_DEFAULTS = dict(
+    (name, Farm.__table__.c[name].default.arg)
+    for name in ('stage', 'active', 'version'))
+
+# Columns that tell the rows of a bulk create apart, to match the ids it
+# returns to them
+BULK_MATCH_COLUMNS = ('name', 'description', 'location', 'units',
+                      'latitude', 'longitude')
+
+# Relationships that can be included in farm documents
+INCLUDES = ('owner',)
+
+# Validators for the fields that can be updated with PATCH
+FIELD_VALIDATORS = {
+    'name': valid_farm_name,
+    'harvest_time': valid_date,
+    'description': valid_description,
+    'location': valid_location,
+    'stage': valid_farm_stage,
+    'units': valid_units,
+    'margin': valid_margin,
+    'active': valid_active_status,
+    'latitude': valid_latitude,
+    'longitude': valid_longitude,
+}
+
+COORDINATES = ('latitude', 'longitude')
+
+# payloads of the single field update endpoint, /farms/<id>/<field>
+FIELD_SCHEMAS = dict(
+    (field, Schema([(field, str)], required=[field], strict=True))
+    for field in FIELD_VALIDATORS)
+
+
+def column_value(field, value):
+    """
+    Converts a validated field value to the value stored in its column
+    """
+    if field == 'active':
+        return False if value == 'inactive' else value
+    return value
+
+
+def validate_field(field, value):
+    """
+    Returns the column value for a new value of field, or None if the value
+    is invalid
+    """
+    new_field_value = FIELD_VALIDATORS[field](value)
+    # a coordinate of 0 is valid
+    if new_field_value is None or \
+            (not new_field_value and field not in COORDINATES):
+        return None
+    return column_value(field, new_field_value)
+
+
+def farm_etag(include, *parts):
+    """
+    Returns the ETag of a farms document identified by parts. Documents that
+    include owners also follow the users change counter.
+    """
+    if 'owner' in include:
+        parts += ('users', get_change_counter('users'))
+    return make_etag('farms', *parts)
+
+
+def included_owners(farms):
+    """
+    Returns the serialized owners of the given farm rows, deduplicated and
+    loaded with a single query
+    """
+    ids = set(farm.user_id for farm in farms if farm.user_id is not None)
+    if not ids:
+        return []
+    owners = User.query.filter(User.id.in_(ids)).order_by(User.id)
+    return [owner.serialize for owner in owners]
+
+
+def new_farm_values(args):
+    """
+    Validates the fields of a farm to be created. Returns a tuple of the
+    column values and None, or of None and the error message for the first
+    invalid field.
+    """
+    name = args.get('name')
+    description = args.get('description')
+    location = args.get('location')
+    units = args.get('units')
+
+    # Validate input data
+    if not valid_farm_name(name):
+        return None, "'name' field missing or invalid"
+    if not valid_description(description):
+        return None, "'description' field missing or invalid"
+    if not valid_location(location):
+        return None, "'location' field missing or invalid"
+    if not valid_units(units):
+        return None, "'units' field missing or invalid"
+
+    values = {
+        'name': name,
+        'description': description,
+        'location': location,
+        'units': valid_units(units),
+        # every farm gets the same keys, so that rows of a bulk create can
+        # share one multi-row INSERT
+        'latitude': None,
+        'longitude': None,
+        'geohash': None,
+    }
+
+    # Coordinates are optional, but come in pairs
+    latitude = args.get('latitude')
+    longitude = args.get('longitude')
+    if latitude is not None or longitude is not None:
+        latitude = valid_latitude(latitude)
+        longitude = valid_longitude(longitude)
+        if latitude is None or longitude is None:
+            return None, "'latitude' and 'longitude' fields invalid"
+        values.update(latitude=latitude, longitude=longitude,
+                      geohash=encode(latitude, longitude))
+    return values, None
+
+
+def assign_returned_ids(rows, returned):
+    """
+    Sets the id of each bulk created row from the (id, *BULK_MATCH_COLUMNS)
+    rows an INSERT .. RETURNING gave back. RETURNING is not guaranteed to
+    follow the order of the VALUES, so ids are matched to rows by the values
+    they were given; rows with the same values are interchangeable.
+    """
+    unmatched = {}
+    for row in reversed(rows):
+        key = tuple(row[name] for name in BULK_MATCH_COLUMNS)
+        unmatched.setdefault(key, []).append(row)
+    for values in returned:
+        unmatched[tuple(values[1:])].pop()['id'] = values[0]
+
 
 class FarmAPI(Resource):
     @jwt_required    
     def post(self):
-        args = parser.parse_args()
-        name = args['name']
-        description = args['description']
-        location = args['location']
-        units = args['units']
-
-        # Validate input data
-        if not valid_farm_name(name):
-            return raise_error(400, "'name' field missing or invalid")
-        if not valid_description(description):
-            return raise_error(400, "'description' field missing or invalid")
-        if not valid_location(location):
-            return raise_error(400, "'location' field missing or invalid")
-        if not valid_units(units):
-            return raise_error(400, "'units' field missing or invalid")
-
-        farm = Farm(
-            name=name, 
-            description=description,
-            location=location,
-            units=units,
-            user_id=current_user.id
-        )
+        args = FARM_SCHEMA.parse()
+        values, error = new_farm_values(args)
+        if error:
+            return raise_error(400, error)
+
+        farm = Farm(user_id=current_user.id, **values)
         db.session.add(farm)
+        # flush for the stage and active defaults
+        db.session.flush()
+        count_farms(added=[farm_stat_values(farm)])
+        bump_change_counter('farms')
         db.session.commit()
         uri = url_for('one-acre.farm', id=farm.id, _external=True)
 
@@ -64,38 +287,91 @@ class FarmAPI(Resource):
     @jwt_required    
     def get(self, id=None):
         # Return farm data
+        try:
+            include = requested_includes(INCLUDES)
+            # included owners are linked to their farms by createdby
+            fields = sparse_fieldset(
+                FARM_COLUMNS, 'farms',
+                keep=['createdby'] if 'owner' in include else [])
+        except InvalidQueryParameter as e:
+            return raise_error(400, str(e))
+        # owners are looked up from the farms' user_id
+        extra = [Farm.user_id] if 'owner' in include else []
+
         if id is None:
-            # Return a collection of all farms
-            all_farms = Farm.query.all()
+            # Return a page of the farm collection. Its ETag follows the
+            # farms change counter, which every write to the table bumps.
+            etag = farm_etag(include, get_change_counter('farms'))
+            response = not_modified(etag)
+            if response:
+                return response
+            try:
+                sort_fields, default_sort = dict(SORT_FIELDS), 'createdon'
+                if 'filter[near]' in request.args:
+                    # nearest first; page[size]=k gives the k nearest
+                    latitude, longitude, _ = near_point()
+                    sort_fields['distance'] = squared_distance(
+                        latitude, longitude).label('distance')
+                    default_sort = 'distance'
+                search = request.args.get('filter[q]')
+                if search is not None:
+                    # search results come most relevant first
+                    sort_fields['relevance'] = search_rank(search)
+                    default_sort = '-relevance'
+                keys = sort_keys(sort_fields, default_sort, Farm.id)
+                # only the requested columns are read, plus the sort keys
+                # the page cursors are made of
+                query = fields.query(*[column for column, _ in keys] + extra)
+                page = paginate(apply_filters(query, FILTERS), keys)
+            except InvalidQueryParameter as e:
+                return raise_error(400, str(e))
             output = {}
             output['status'] = 200
-            data = all_farms
-            if all_farms:
-                data = [farm.serialize for farm in all_farms]
-            output['data'] = data
+            output['data'] = fields.serialize(page.items)
+            if 'owner' in include:
+                output['included'] = included_owners(page.items)
+            output['links'] = page.links
 
-            return output
+            return json_response(output, 200, {'ETag': etag})
 
         if not id.isnumeric():
             return raise_error(400, "Farm ID should be an integer")
         farm_id = int(id)
-        farm = Farm.query.get(farm_id)
+        if request.if_none_match:
+            # Answer revalidations from the version column alone
+            version = db.session.query(Farm.version)\
+                .filter_by(id=farm_id).scalar()
+            if version is not None:
+                response = not_modified(
+                    farm_etag(include, farm_id, version))
+                if response:
+                    return response
+        farm = fields.query(Farm.version, *extra)\
+            .filter(Farm.id == farm_id).first()
         if not farm:
             return raise_error(404, "Requested farm does not exist")
 
         output = {}
         output['status'] = 200
-        output['data'] = [farm.serialize]
+        output['data'] = fields.serialize([farm])
+        if 'owner' in include:
+            output['included'] = included_owners([farm])
 
-        return output
+        etag = farm_etag(include, farm_id, farm.version)
+        return output, 200, {'ETag': etag}
 
     @jwt_required    
-    def patch(self, id, field):
+    def patch(self, id, field=None):
 
         if not id.isnumeric():
             return raise_error(400, "Farm ID should be an integer")
         farm_id = int(id)
-        farm = Farm.query.get(farm_id)
+        if field is None:
+            return self.patch_fields(farm_id)
+        # locked, so that the farm statistics are adjusted by the values
+        # this write replaces, not by those of a concurrent one
+        farm = Farm.query.filter_by(id=farm_id).with_for_update()\
+            .populate_existing().first()
         if not farm:
             return raise_error(404, "Farm does not exist")
 
@@ -104,66 +380,34 @@ class FarmAPI(Resource):
                                'to access this resource')
 
         # update farm with given ID
-        if not id.isnumeric():
-            return raise_error(400, "Farm ID should be an integer")
-        if field not in ('name', 'harvest_time', 'description', 'location',
-                         'stage', 'units', 'margin', 'active'):
+        if field not in FIELD_VALIDATORS:
             return raise_error(400, "Invalid field name")
 
-        parser = reqparse.RequestParser()
-        parser.add_argument(field, type=str, required=True)
-
         try:
-            args = parser.parse_args(strict=True)
-        except:
+            args = FIELD_SCHEMAS[field].parse()
+        except (InvalidPayload, BadRequest):
             error_msg = "Please provide the {} field only".format(field)
             return raise_error(400, error_msg)
 
-        new_field_value = args.get(field)
-        if field == 'name':
-            new_field_value = valid_farm_name(new_field_value)
-        elif field == 'units':
-            new_field_value = valid_units(new_field_value)
-        elif field == 'description':
-            new_field_value = valid_description(new_field_value)
-        elif field == 'harvest_time':
-            new_field_value = valid_date(new_field_value)
-        elif field == 'margin':
-            new_field_value = valid_margin(new_field_value)
-        elif field == 'stage':
-            new_field_value = valid_farm_stage(new_field_value)
-        elif field == 'location':
-            new_field_value = valid_location(new_field_value)
-        elif field == 'active':
-            new_field_value = valid_active_status(new_field_value)
-
-        if not new_field_value:
+        new_field_value = validate_field(field, args.get(field))
+        if new_field_value is None:
             return raise_error(400, "Invalid data in {} field".format(field))
 
+        # one coordinate alone may only move a farm that already has both
+        if field in COORDINATES and any(
+                getattr(farm, other) is None for other in COORDINATES
+                if other != field):
+            return raise_error(400, "'latitude' and 'longitude' should be "
+                               "updated together")
 
-        if not farm:
-            return raise_error(404, "Farm does not exist")
-        if field == 'name':
-            farm.name = new_field_value
-        if field == 'description':
-            farm.description = new_field_value
-        if field == "category":
-            farm.category = new_field_value
-        if field == 'harvest_time':
-            farm.harvest_time = new_field_value
-        if field == 'margin':
-            farm.margin = new_field_value
-        if field == 'stage':
-            farm.stage = new_field_value
-        if field == 'location':
-            farm.location = new_field_value
-        if field == 'units':
-            farm.units = new_field_value
-        if field == 'active':
-            farm.active = (False if new_field_value == 'inactive' else
-            new_field_value)
-
-
+        old_values = farm_stat_values(farm)
+        setattr(farm, field, new_field_value)
+        if field in COORDINATES:
+            farm.geohash = encode(farm.latitude, farm.longitude)
+        if field in STAT_FIELDS:
+            count_farms(added=[farm_stat_values(farm)], removed=[old_values])
+        farm.version = Farm.version + 1
+        bump_change_counter('farms')
         db.session.commit()
 
         output = {}
@@ -174,21 +418,98 @@ class FarmAPI(Resource):
 
         return output
 
+    def patch_fields(self, farm_id):
+        """
+        Updates several fields of a farm from a JSON object of attributes.
+        All fields are validated first and then written with a single
+        UPDATE that also checks ownership, so the farm is never loaded.
+        """
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict) or not body:
+            return raise_error(400, "Provide the fields to update as a JSON "
+                               "object")
+
+        values = {}
+        for field, value in body.items():
+            if field not in FIELD_VALIDATORS:
+                return raise_error(400, "Invalid field name")
+            # match the str conversion of the single field endpoint
+            new_field_value = validate_field(
+                field, None if value is None else str(value))
+            if new_field_value is None:
+                return raise_error(400, "Invalid data in {} field".format(field))
+            values[field] = new_field_value
+        if any(field in values for field in COORDINATES):
+            if not all(field in values for field in COORDINATES):
+                return raise_error(400, "'latitude' and 'longitude' should "
+                                   "be updated together")
+            values['geohash'] = encode(values['latitude'],
+                                       values['longitude'])
+
+        old_values = None
+        if any(field in STAT_FIELDS for field in values):
+            # the statistics need the values being replaced; lock the row
+            # so that they stay the same until the update
+            old_values = db.session.query(
+                *[getattr(Farm, field) for field in STAT_FIELDS])\
+                .filter_by(id=farm_id, user_id=current_user.id)\
+                .with_for_update().first()
+        values['version'] = Farm.version + 1
+
+        updated = Farm.query.filter_by(id=farm_id, user_id=current_user.id)\
+            .update(values, synchronize_session=False)
+        if not updated:
+            db.session.rollback()
+            # Only failed updates pay for finding out why
+            if db.session.query(Farm.id).filter_by(id=farm_id).scalar() is None:
+                return raise_error(404, "Farm does not exist")
+            return raise_error(403, 'Request forbidden - you are not allowed'
+                               'to access this resource')
+        del values['version']
+        values.pop('geohash', None)
+        if old_values is not None:
+            old_values = dict(zip(STAT_FIELDS, old_values))
+            new_values = dict(old_values)
+            new_values.update((field, value)
+                              for field, value in values.items()
+                              if field in STAT_FIELDS)
+            count_farms(added=[new_values], removed=[old_values])
+        bump_change_counter('farms')
+        db.session.commit()
+
+        data = {'id': farm_id}
+        for field, value in values.items():
+            if field == 'harvest_time':
+                value = value.strftime('%a, %d %b %Y')
+            data[field] = value
+        data['message'] = 'successfully updated farm {} fields'.format(
+            ', '.join(sorted(values)))
+
+        output = {}
+        output['status'] = 200
+        output['data'] = [data]
+
+        return output
+
     @jwt_required
     def delete(self, id):
         # Delete farm with given ID
         if not id.isnumeric():
             return raise_error(400, "Farm ID should be an integer")
         farm_id = int(id)
-        farm = Farm.query.get(farm_id)
+        # locked, so that the farm statistics are adjusted by the values
+        # this write replaces, not by those of a concurrent one
+        farm = Farm.query.filter_by(id=farm_id).with_for_update()\
+            .populate_existing().first()
         if not farm:
             return raise_error(404, "Farm does not exist")
-        farm = Farm.query.get(farm_id)
 
         if current_user.id != farm.user_id:
             return raise_error(403, 'Request forbidden - you are not allowed'
                                'to access this resource')
+        count_farms(removed=[farm_stat_values(farm)])
         db.session.delete(farm)
+        bump_change_counter('farms')
         db.session.commit()
 
         output = {}
@@ -196,3 +517,160 @@ class FarmAPI(Resource):
         output['status'] = 200
         output['data'] = [{'id': farm_id, 'message': message}]
         return output
+
+
+class FarmBulkAPI(Resource):
+    """
+    Creates many farms in one request from a JSON:API array of farm
+    resources. Every farm is validated before anything is written; if any is
+    invalid nothing is created and the errors are reported per item.
+    Otherwise all farms are inserted with a single multi-row INSERT (one row
+    at a time on databases without INSERT .. RETURNING) in one transaction.
+    """
+
+    @jwt_required
+    def post(self):
+        body = request.get_json(silent=True) or {}
+        resources = body.get('data') if isinstance(body, dict) else None
+        if not isinstance(resources, list) or not resources:
+            return raise_error(400, "'data' should be a non-empty array of "
+                               "farm resources")
+        max_size = current_app.config['MAX_BULK_SIZE']
+        if len(resources) > max_size:
+            return raise_error(400, "At most {} farms can be created per "
+                               "request".format(max_size))
+
+        now = datetime.utcnow()
+        rows = []
+        errors = []
+        for index, resource in enumerate(resources):
+            attributes = None
+            if isinstance(resource, dict) and \
+                    resource.get('type', 'farms') == 'farms':
+                attributes = resource.get('attributes')
+            if not isinstance(attributes, dict):
+                errors.append({'index': index,
+                               'error': "Expected a farms resource with "
+                                        "'attributes'"})
+                continue
+            values, error = new_farm_values(FARM_SCHEMA.load(attributes))
+            if error:
+                errors.append({'index': index, 'error': error})
+                continue
+            values.update(BULK_DEFAULTS, user_id=current_user.id,
+                          createdon=now)
+            rows.append(values)
+
+        if errors:
+            return {'status': 400,
+                    'error': 'No farms were created, some are invalid',
+                    'errors': errors}, 400
+
+        table = Farm.__table__
+        if db.session.get_bind().dialect.implicit_returning:
+            columns = [table.c[name] for name in BULK_MATCH_COLUMNS]
+            result = db.session.execute(
+                table.insert().values(rows).returning(table.c.id, *columns))
+            assign_returned_ids(rows, result)
+        else:
+            db.session.bulk_insert_mappings(Farm, rows, return_defaults=True)
+        count_farms(added=rows)
+        bump_change_counter('farms')
+        db.session.commit()
+
+        collection_uri = url_for('one-acre.farm', _external=True)
+        data = []
+        for row in rows:
+            item = Farm(**row).serialize
+            item['uri'] = '{}/{}'.format(collection_uri, row['id'])
+            data.append(item)
+
+        output = {}
+        output['status'] = 201
+        output['message'] = 'Created {} farms'.format(len(data))
+        output['data'] = data
+
+        return output, 201
+
+
+class FarmStats(Resource):
+    """
+    Number of farms, total units and average margin per location, stage and
+    active status, read from the farm_stats summary table
+    """
+
+    @jwt_required
+    def get(self):
+        # every write to farms (and a rebuild of the statistics) bumps the
+        # farms change counter
+        etag = make_etag('farm-stats', get_change_counter('farms'))
+        response = not_modified(etag)
+        if response:
+            return response
+
+        data = []
+        for row in get_farm_stats():
+            margin_count = int(row.margin_count)
+            data.append({
+                'location': row.location,
+                'stage': row.stage,
+                'active': row.active,
+                'farms': int(row.farms),
+                'units': int(row.units),
+                'average_margin': float(row.margin_sum) / margin_count
+                if margin_count else None,
+            })
+
+        output = {}
+        output['status'] = 200
+        output['data'] = data
+
+        return output, 200, {'ETag': etag}
+
+
+class FarmExport(Resource):
+    """
+    Streams the whole farm collection as NDJSON (the default) or as one JSON
+    array. Rows are read through a server-side cursor in batches of
+    EXPORT_BATCH_SIZE and written out a batch at a time, so memory use does
+    not grow with the size of the table.
+    """
+
+    @jwt_required
+    def get(self):
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in ('ndjson', 'json'):
+            return raise_error(400, "'format' should be one of ndjson, json")
+
+        batch_size = current_app.config['EXPORT_BATCH_SIZE']
+        rows = FARM_COLUMNS.query().order_by(Farm.id).yield_per(batch_size)
+
+        def encode_batch(batch):
+            return [dumps(farm) for farm in FARM_COLUMNS.serialize(batch)]
+
+        def batches():
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) == batch_size:
+                    yield encode_batch(batch)
+                    batch = []
+            if batch:
+                yield encode_batch(batch)
+
+        def generate_ndjson():
+            for batch in batches():
+                yield b'\n'.join(batch) + b'\n'
+
+        def generate_json():
+            separator = b'['
+            for batch in batches():
+                yield separator + b','.join(batch)
+                separator = b','
+            yield b'[]' if separator == b'[' else b']'
+
+        if export_format == 'json':
+            return Response(stream_with_context(generate_json()),
+                            mimetype='application/json')
+        return Response(stream_with_context(generate_ndjson()),
+                        mimetype='application/x-ndjson')
@@ -0,0 +1,16 @@
+from flask import Response
+from flask_jwt_extended import jwt_required
+from flask_restful import Resource
+from app.decorators import admin_required
+from app.metrics import CONTENT_TYPE, registry, render
+
+
+class Metrics(Resource):
+    """
+    Serves the application metrics in the Prometheus text format to admins
+    """
+    @jwt_required
+    @admin_required
+    def get(self):
+        return Response(render(registry.totals()),
+                        content_type=CONTENT_TYPE)
@@ -1,10 +1,16 @@
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from flask_restful import Resource, reqparse, request
+from flask_restful import Resource, request
 from app.exceptions import TokenNotFound
-from app.helpers import get_user_tokens, revoke_token, unrevoke_token, prune_database
+from app.helpers import (
+    get_user_tokens, revoke_token, unrevoke_token, prune_database,
+    count_expired_tokens
+)
 from app.decorators import admin_required
 from .common.utils import valid_email, valid_password
 from .common.errors import raise_error
+from .common.schemas import Schema
+
+REVOKE_SCHEMA = Schema([('revoke', bool)])
 
 class Tokens(Resource):
     # Provide a way for a user to look at their tokens
@@ -22,10 +28,8 @@ class Tokens(Resource):
 
     @jwt_required
     def put(self, token_id):
-        parser = reqparse.RequestParser()
-        parser.add_argument('revoke', type=bool)
         # Get and verify the desired revoked status from the body
-        args = parser.parse_args()
+        args = REVOKE_SCHEMA.parse()
         if not args:
             return raise_error(400, "Missing 'revoke' in body")
         revoke = args.get('revoke', None)
@@ -49,12 +53,16 @@ class Tokens(Resource):
     @admin_required
     def delete(self):
         """
-        Delete all expired tokens from blacklist database
+        Delete one batch of expired tokens from blacklist database. Clients
+        repeat the request while tokens remain; large backlogs are left to
+        `flask prune-tokens` or the background pruner.
         """
-        prune_database()
+        deleted = prune_database(max_batches=1)
+        remaining = count_expired_tokens()
 
         return {
                 "status": 200,
-                "message": "Blacklist database successfully pruned"
+                "message": "Blacklist database successfully pruned",
+                "data": [{"deleted": deleted, "remaining": remaining}]
                 }
 
@@ -0,0 +1,173 @@
+"""
+app.asgi
+~~~~~~~~
+
+ASGI entry point
+
+Serves the application to an ASGI server such as uvicorn or hypercorn::
+
+    uvicorn --factory app.asgi:create_asgi_app
+
+Connections, keep-alive and slow clients are handled by the server's event
+loop, so idle and waiting clients hold no thread. Requests themselves run
+the same Flask application, and so give the same responses, on a pool of
+ASGI_WORKERS threads; response bodies are streamed back as the application
+produces them.
+"""
+import asyncio
+import functools
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from config import Config
+
+# separator of repeated request headers folded into one environ key;
+# cookies are separated by '; ' rather than ','
+HEADER_SEPARATORS = {'HTTP_COOKIE': '; '}
+
+
+def _running_loop():
+    # asyncio.get_running_loop is only available from Python 3.7
+    get_loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)
+    return get_loop()
+
+
+def _environ(scope, body):
+    """
+    Builds the WSGI environ for an ASGI http scope and request body
+    """
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    path = scope['path'].encode('utf-8').decode('latin-1')
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode(
+            'utf-8').decode('latin-1'),
+        'PATH_INFO': path,
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+            continue
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = 'HTTP_' + name
+        if key in environ:
+            value = environ[key] + HEADER_SEPARATORS.get(key, ',') + value
+        environ[key] = value
+    return environ
+
+
+class ASGIApp(object):
+    """
+    Runs a WSGI application for an ASGI server on a bounded thread pool
+
+    :param wsgi_app: the WSGI application
+    :param workers: most requests run at once; further requests wait for a
+                    worker without holding a thread
+    """
+
+    def __init__(self, wsgi_app, workers):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise ValueError("Unsupported scope type {}".format(
+                scope['type']))
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # wait for running requests without blocking the event loop
+                await _running_loop().run_in_executor(
+                    None, functools.partial(self.executor.shutdown,
+                                            wait=True))
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        environ = _environ(scope, b''.join(chunks))
+        loop = _running_loop()
+        await loop.run_in_executor(self.executor, self._run, environ, send,
+                                   loop)
+
+    def _run(self, environ, send, loop):
+        """
+        Calls the application on a worker thread, sending the response back
+        through the event loop chunk by chunk
+        """
+        def send_message(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get('started'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers]
+
+        def start():
+            if not response.get('started'):
+                response['started'] = True
+                send_message({'type': 'http.response.start',
+                              'status': response['status'],
+                              'headers': response['headers']})
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in result:
+                if chunk:
+                    start()
+                    send_message({'type': 'http.response.body',
+                                  'body': chunk, 'more_body': True})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        start()
+        send_message({'type': 'http.response.body', 'body': b''})
+
+
+def create_asgi_app(config=Config):
+    """
+    Creates the application and returns it as an ASGI application
+    """
+    from app import create_app
+
+    app = create_app(config)
+    return ASGIApp(app, app.config['ASGI_WORKERS'])
@@ -0,0 +1,93 @@
+"""
+app.cache
+~~~~~~~~~
+
+Small in-process caches
+
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache(object):
+    """
+    A bounded, thread-safe LRU cache whose entries also expire after a time
+    to live. Entries may be given an earlier expiry (e.g. a token's ``exp``)
+    when they are set.
+
+    The cache is configured from the application config with ``init_app``
+    using ``<PREFIX>_ENABLED``, ``<PREFIX>_SIZE`` and ``<PREFIX>_TTL``. While
+    disabled, every lookup misses and nothing is stored.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, enabled=True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app, prefix):
+        self.enabled = app.config.get(prefix + '_ENABLED', self.enabled)
+        self.maxsize = app.config.get(prefix + '_SIZE', self.maxsize)
+        self.ttl = app.config.get(prefix + '_TTL', self.ttl)
+        self.clear()
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value for key, or default if it is missing or
+        has expired
+        """
+        if not self.enabled:
+            return default
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+        return default
+
+    def set(self, key, value, expires_at=None):
+        """
+        Stores value under key until ``expires_at`` (epoch seconds) or the
+        cache ttl, whichever comes first
+        """
+        if not self.enabled:
+            return
+        deadline = time.time() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self._lock:
+            self._data[key] = (value, deadline)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
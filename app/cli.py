@@ -0,0 +1,44 @@
+"""
+app.cli
+~~~~~~~
+
+Flask CLI commands for maintenance tasks
+
+"""
+import time
+
+import click
+from flask.cli import with_appcontext
+
+from .helpers import prune_database
+from .stats import rebuild_farm_stats
+
+
+@click.command('prune-tokens')
+@click.option('--batch-size', type=int, default=None,
+              help='Rows deleted per batch (TOKEN_PRUNE_BATCH_SIZE).')
+@with_appcontext
+def prune_tokens_command(batch_size):
+    """Delete expired tokens from the token store in batches."""
+    def report(deleted, elapsed):
+        click.echo('deleted {} tokens in {:.3f}s'.format(deleted, elapsed))
+
+    started = time.time()
+    total = prune_database(batch_size, on_batch=report)
+    click.echo('pruned {} expired tokens in {:.3f}s'.format(
+        total, time.time() - started))
+
+
+@click.command('rebuild-farm-stats')
+@with_appcontext
+def rebuild_farm_stats_command():
+    """Recompute the farm statistics summary table from the farms."""
+    started = time.time()
+    groups = rebuild_farm_stats()
+    click.echo('rebuilt {} farm statistics groups in {:.3f}s'.format(
+        groups, time.time() - started))
+
+
+def init_app(app):
+    app.cli.add_command(prune_tokens_command)
+    app.cli.add_command(rebuild_farm_stats_command)
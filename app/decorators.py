@@ -9,7 +9,7 @@ Custom decorators
 
 from functools import wraps
 from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
-from app.models import User
+from app.helpers import get_user_by_email
 
 def admin_required(fn):
     """
@@ -20,8 +20,8 @@ def admin_required(fn):
     def wrapper(*args, **kwargs):
         verify_jwt_in_request()
         user_email = get_jwt_identity()
-        user = User.query.filter_by(email=user_email).first()
-        if not user.admin:
+        user = get_user_by_email(user_email)
+        if user is None or not user.admin:
             return {'status': 403, 'message': 'Only admins can access this endpoint'}, 403
         return fn(*args, **kwargs)
     return wrapper
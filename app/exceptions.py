@@ -4,3 +4,34 @@ class TokenNotFound(Exception):
     Indicates that a token could not be found in the database
     """
     pass
+
+
+class InvalidQueryParameter(Exception):
+    """
+    Indicates that a query string parameter is malformed or not supported
+    """
+    pass
+
+
+class HashingBusy(Exception):
+    """
+    Indicates that the password hashing pool is full and the request should
+    be retried later
+    """
+    pass
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    Indicates that a request ran more SQL statements than the configured
+    PROFILE_QUERY_BUDGET
+    """
+    pass
+
+
+class InvalidPayload(Exception):
+    """
+    Indicates that a request body is missing required fields or has
+    fields that are not allowed
+    """
+    pass
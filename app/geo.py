@@ -0,0 +1,157 @@
+"""
+app.geo
+~~~~~~~
+
+Geohash cells and radius queries for farm coordinates
+
+A farm with coordinates stores the geohash of its position in the indexed
+farms.geohash column. Geohashes of nearby points share prefixes, so the
+farms inside any geohash cell are one B-tree range scan on that column on
+every database. A radius query scans the few cells covering the circle's
+bounding box and then filters on distance.
+
+Distances use an equirectangular approximation around the query point,
+which needs only arithmetic in SQL and is well within 1% for the radii
+allowed. Queries do not wrap around the antimeridian.
+"""
+import math
+
+from sqlalchemy import and_, or_
+
+from .models import Farm
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Characters stored per farm (cells of about 5 x 5 m)
+PRECISION = 9
+
+# Most cells a radius query may scan
+MAX_CELLS = 16
+
+KM_PER_DEGREE = 111.195
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """
+    Returns the geohash of a point, or None unless both coordinates are
+    given
+    """
+    if latitude is None or longitude is None:
+        return None
+    # points past the antimeridian belong to cells on the other side
+    longitude = (longitude + 180.0) % 360.0 - 180.0
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            interval, coordinate = lon_range, longitude
+        else:
+            interval, coordinate = lat_range, latitude
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def _cell_size(precision):
+    """
+    Returns the height and width in degrees of cells of the given precision
+    """
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def _bounding_box(latitude, longitude, radius):
+    dlat = radius / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(latitude))
+    dlon = 180.0
+    if cos_lat > 1e-9:
+        dlon = min(radius / (KM_PER_DEGREE * cos_lat), 180.0)
+    return (max(latitude - dlat, -90.0), min(latitude + dlat, 90.0),
+            longitude - dlon, longitude + dlon)
+
+
+def covering_cells(latitude, longitude, radius):
+    """
+    Returns the geohash cells covering the circle of radius km around a
+    point, using the finest precision for which at most MAX_CELLS do
+    """
+    south, north, west, east = _bounding_box(latitude, longitude, radius)
+    for precision in range(PRECISION, 0, -1):
+        height, width = _cell_size(precision)
+        rows = int(math.floor(north / height) - math.floor(south / height)) + 1
+        columns = int(math.floor(east / width) - math.floor(west / width)) + 1
+        if rows * columns <= MAX_CELLS or precision == 1:
+            break
+    cells = set()
+    for row in range(rows):
+        lat = min(south + row * height, north)
+        for column in range(columns):
+            lon = min(west + column * width, east)
+            cells.add(encode(lat, lon, precision))
+        cells.add(encode(lat, east, precision))
+    for column in range(columns):
+        cells.add(encode(north, min(west + column * width, east), precision))
+    cells.add(encode(north, east, precision))
+    return sorted(cells)
+
+
+def _next_cell(cell):
+    """
+    Returns the smallest geohash after every geohash starting with cell, or
+    None if there is none
+    """
+    while cell and cell[-1] == BASE32[-1]:
+        cell = cell[:-1]
+    if not cell:
+        return None
+    return cell[:-1] + BASE32[BASE32.index(cell[-1]) + 1]
+
+
+def in_cells(cells):
+    """
+    Returns the condition for farms whose geohash starts with one of cells,
+    as ranges the geohash index can scan
+    """
+    ranges = []
+    for cell in cells:
+        upper = _next_cell(cell)
+        condition = Farm.geohash >= cell
+        if upper is not None:
+            condition = and_(condition, Farm.geohash < upper)
+        ranges.append(condition)
+    return or_(*ranges)
+
+
+def squared_distance(latitude, longitude):
+    """
+    Returns the SQL expression for the squared distance in km² of a farm
+    from a point
+    """
+    scale = KM_PER_DEGREE * math.cos(math.radians(latitude))
+    north = (Farm.latitude - latitude) * KM_PER_DEGREE
+    east = (Farm.longitude - longitude) * scale
+    return north * north + east * east
+
+
+def within(latitude, longitude, radius):
+    """
+    Returns the condition for farms within radius km of a point
+    """
+    return and_(in_cells(covering_cells(latitude, longitude, radius)),
+                squared_distance(latitude, longitude) <= radius * radius)
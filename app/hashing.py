@@ -0,0 +1,78 @@
+"""
+app.hashing
+~~~~~~~~~~~
+
+Password hashing on a bounded worker pool
+
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .exceptions import HashingBusy
+from .metrics import timed
+
+
+class PasswordHasher(object):
+    """
+    Runs bcrypt on a dedicated thread pool instead of the request thread.
+
+    At most PASSWORD_HASH_WORKERS hashes run at once, which caps the CPU that
+    logins and signups can take from other requests, and at most
+    PASSWORD_HASH_QUEUE_DEPTH more may wait for a worker. Past that
+    HashingBusy is raised straight away so the endpoint can answer 503
+    instead of queueing up latency. The cost factor is Flask-Bcrypt's
+    BCRYPT_LOG_ROUNDS.
+    """
+
+    def __init__(self, bcrypt):
+        self._bcrypt = bcrypt
+        self._executor = None
+        self._slots = None
+        self.log_rounds = 12
+
+    def init_app(self, app):
+        workers = app.config['PASSWORD_HASH_WORKERS']
+        queue_depth = app.config['PASSWORD_HASH_QUEUE_DEPTH']
+        self.log_rounds = app.config['BCRYPT_LOG_ROUNDS']
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+
+    def _run(self, fn, *args):
+        # the slot is released on the semaphore it was taken from, even if
+        # init_app replaces the semaphore in the meantime
+        slots = self._slots
+        if not slots.acquire(False):
+            raise HashingBusy("Too many password hashes in progress")
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future.result()
+
+    @timed('password_hash_duration_seconds', operation='hash')
+    def _hash(self, password):
+        return self._bcrypt.generate_password_hash(password, self.log_rounds)
+
+    @timed('password_hash_duration_seconds', operation='check')
+    def _check(self, pw_hash, password):
+        return self._bcrypt.check_password_hash(pw_hash, password)
+
+    def generate_password_hash(self, password):
+        return self._run(self._hash, password).decode('utf-8')
+
+    def check_password_hash(self, pw_hash, password):
+        return self._run(self._check, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        """
+        Tells whether pw_hash was made with a different cost factor than
+        the configured one
+        """
+        try:
+            return int(pw_hash.split('$')[2]) != self.log_rounds
+        except (AttributeError, IndexError, ValueError):
+            return True
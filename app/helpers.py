@@ -5,14 +5,94 @@ app.helpers
 Implements various helper functions
 
 """
+import base64
+import json
+import threading
+import time
+from collections import namedtuple
 from datetime import datetime
 
-from flask_jwt_extended import decode_token
+from flask import current_app, g
+from flask_jwt_extended import create_access_token, create_refresh_token
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
 
+from .bloom import BloomFilter
 from .exceptions import TokenNotFound
-from .models import TokenBlacklist
-from . import db
+from .metrics import timed
+from .models import TokenBlacklist, ChangeCounter, User
+from .routing import on_primary
+from .writebehind import TokenWriter
+from . import db, partitions, revocation_cache, user_cache
+
+# What the user cache keeps of a user across requests
+UserIdentity = namedtuple('UserIdentity', ['id', 'email', 'admin'])
+
+
+class RevokedTokenFilter(object):
+    """
+    Bloom filter over the jtis held in the token store. In the revocation-only
+    store mode that table only holds revoked tokens, so a jti that is not in
+    the filter is known not to be revoked without asking the database.
+
+    The filter is built from the table on first use and rebuilt every
+    TOKEN_BLOOM_REFRESH seconds to pick up revokes made by other processes.
+    Revokes made by this process are added straight away.
+    """
+
+    def __init__(self):
+        self._bloom = None
+        self._built_at = 0
+        self._lock = threading.Lock()
+
+    def _rebuild(self):
+        config = current_app.config
+        capacity = config['TOKEN_BLOOM_CAPACITY']
+        if self._bloom is not None:
+            capacity = max(capacity, 2 * len(self._bloom))
+        bloom = BloomFilter(capacity, config['TOKEN_BLOOM_ERROR_RATE'])
+        if _partitioned():
+            jtis = partitions.all_jtis()
+        else:
+            jtis = (jti for (jti,) in db.session.query(TokenBlacklist.jti))
+        for jti in jtis:
+            bloom.add(jti)
+        self._bloom = bloom
+        self._built_at = time.time()
+
+    def _refresh(self):
+        interval = current_app.config['TOKEN_BLOOM_REFRESH']
+        if self._bloom is not None and time.time() - self._built_at < interval:
+            return
+        # Only one thread rebuilds; the others keep using the current filter
+        if not self._lock.acquire(self._bloom is None):
+            return
+        try:
+            if self._bloom is None or time.time() - self._built_at >= interval:
+                self._rebuild()
+        finally:
+            self._lock.release()
+
+    def add(self, jti):
+        if self._bloom is not None:
+            self._bloom.add(jti)
+
+    def __contains__(self, jti):
+        self._refresh()
+        return jti in self._bloom
+
+
+revoked_filter = RevokedTokenFilter()
+
+
+def _revocation_only():
+    return current_app.config['TOKEN_STORE_MODE'] == 'revoked'
+
+
+def _partitioned():
+    return current_app.config['TOKEN_STORE_LAYOUT'] == 'partitioned'
+
 
 def _epoch_utc_to_datetime(epoch_utc):
     """
@@ -26,47 +106,136 @@ def _epoch_utc_to_datetime(epoch_utc):
     return datetime.fromtimestamp(epoch_utc)
 
 
-def add_token_to_database(encoded_token, identity_claim):
+def _token_claims(encoded_token):
     """
-    Adds a new token to the database. It is not revoked when it is added.
-    :param identity_claim:
+    Reads the claims of a token we have just encoded ourselves. Unlike
+    decode_token this does not verify the signature or validate the claims
+    again, as the token never left the server.
     """
-    decoded_token = decode_token(encoded_token)
-    jti = decoded_token['jti']
-    token_type = decoded_token['type']
-    user_identity = decoded_token[identity_claim]
-    expires = _epoch_utc_to_datetime(decoded_token['exp'])
-    revoked = False
-
-    db_token = TokenBlacklist(
-        jti=jti,
-        token_type=token_type,
-        user_identity=user_identity,
-        expires=expires,
-        revoked=revoked,
-    )
-    db.session.add(db_token)
-    db.session.commit()
+    payload = encoded_token.split('.')[1]
+    payload += '=' * (-len(payload) % 4)
+    return json.loads(
+        base64.urlsafe_b64decode(payload.encode('ascii')).decode('utf-8'))
 
+
+def _write_token_rows(rows):
+    """
+    Writes queued token rows, skipping tokens already stored (revoked by a
+    logout while they were queued)
+    """
+    try:
+        if _partitioned():
+            partitions.add_tokens(rows, skip_existing=True)
+        else:
+            table = TokenBlacklist.__table__
+            stored = set(jti for (jti,) in db.session.execute(
+                select([table.c.jti]).where(
+                    table.c.jti.in_([row['jti'] for row in rows]))))
+            rows = [row for row in rows if row['jti'] not in stored]
+            if rows:
+                db.session.execute(table.insert(), rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+token_writer = TokenWriter(_write_token_rows)
+
+
+def store_tokens(claims, identity_claim):
+    """
+    Adds the tokens with the given claims to the current transaction, not
+    revoked and without committing. Nothing is stored in the revocation-only
+    store mode, and with TOKEN_WRITE_BEHIND the tokens are queued for the
+    token writer instead.
+
+    :param claims: list of the claims of each token
+    """
+    if _revocation_only():
+        return
+    rows = [{
+        'jti': token_claims['jti'],
+        'token_type': token_claims['type'],
+        'user_identity': token_claims[identity_claim],
+        'expires': _epoch_utc_to_datetime(token_claims['exp']),
+        'revoked': False,
+    } for token_claims in claims]
+    if token_writer.enabled:
+        for row in rows:
+            token_writer.put(row)
+    elif _partitioned():
+        partitions.add_tokens(rows)
+    else:
+        db.session.add_all([TokenBlacklist(**row) for row in rows])
+
+
+def issue_tokens(identity, refresh=True):
+    """
+    Creates an access token, and a refresh token unless refresh is False, for
+    identity and stores them in the current transaction without committing,
+    so that callers persist them together with their own changes in a single
+    commit. Returns the encoded access and refresh tokens.
+    """
+    access_token = create_access_token(identity=identity)
+    tokens = [access_token]
+    refresh_token = None
+    if refresh:
+        refresh_token = create_refresh_token(identity=identity)
+        tokens.append(refresh_token)
+    store_tokens([_token_claims(token) for token in tokens],
+                 current_app.config['JWT_IDENTITY_CLAIM'])
+    return access_token, refresh_token
+
+
+@timed('revocation_check_duration_seconds')
+@on_primary
 def is_token_revoked(decoded_token):
     """
     Checks if the given token is revoked or not. Because we are adding all the
     tokens that we create into this database, if the token is not present
     in the database we are going to consider it revoked, as we don't know where
     it was created.
+
+    In the revocation-only store mode only revoked tokens are stored, so an
+    unknown token is not revoked and the bloom filter answers for most tokens.
+    With TOKEN_WRITE_BEHIND, a token that may still be queued for writing is
+    not treated as revoked either.
+
+    Results are kept in the revocation cache until the token expires or the
+    cache ttl runs out.
     """
     jti = decoded_token['jti']
-    try:
-        token = TokenBlacklist.query.filter_by(jti=jti).one()
-        return token.revoked
-    except NoResultFound:
-        return True
-        
+    revoked = revocation_cache.get(jti)
+    if revoked is not None:
+        return revoked
+    if _revocation_only() and jti not in revoked_filter:
+        return False
+    if _partitioned():
+        token = partitions.find_token(
+            jti, _epoch_utc_to_datetime(decoded_token['exp']))
+    else:
+        token = TokenBlacklist.query.filter_by(jti=jti).first()
+    if token is not None:
+        revoked = token.revoked
+    elif _revocation_only():
+        revoked = False
+    elif token_writer.accepts(decoded_token):
+        # issued but not written yet; don't cache the answer
+        return False
+    else:
+        revoked = True
+    revocation_cache.set(jti, revoked, expires_at=decoded_token.get('exp'))
+    return revoked
+
+
 def get_user_tokens(user_identity):
     """
     Returns all of the tokens, revoked and unrevoked, that are stored for the
     given user
     """
+    if _partitioned():
+        return partitions.get_user_tokens(user_identity)
     return TokenBlacklist.query.filter_by(user_identity=user_identity).all()
 
 
@@ -75,34 +244,187 @@ def revoke_token(token_id, user):
     Revokes the given token. Raises a TokenNotFound error if the token does
     not exist in the database
     """
+    if _partitioned():
+        jti = partitions.set_revoked(token_id, user, True)
+        db.session.commit()
+        revocation_cache.invalidate(jti)
+        revoked_filter.add(jti)
+        return
     try:
         token = TokenBlacklist.query.filter_by(id=token_id, user_identity=user).one()
         token.revoked = True
         db.session.commit()
+        revocation_cache.invalidate(token.jti)
+        revoked_filter.add(token.jti)
     except NoResultFound:
         raise TokenNotFound("Could not find the token {}".format(token_id))
 
 
+def _store_revoked(jti, token_type, user_identity, expires):
+    table = TokenBlacklist.__table__
+    updated = db.session.execute(
+        table.update().where(table.c.jti == jti).values(revoked=True))
+    if not updated.rowcount:
+        try:
+            db.session.execute(table.insert().values(
+                jti=jti, token_type=token_type, user_identity=user_identity,
+                expires=expires, revoked=True))
+            db.session.commit()
+            return
+        except IntegrityError:
+            # the token writer stored it in the meantime
+            db.session.rollback()
+            db.session.execute(
+                table.update().where(table.c.jti == jti).values(revoked=True))
+    db.session.commit()
+
+
+def revoke_decoded_token(decoded_token, identity_claim):
+    """
+    Revokes the token the given claims belong to, storing it first if the
+    store does not hold it yet (as in the revocation-only store mode)
+    """
+    jti = decoded_token['jti']
+    expires = _epoch_utc_to_datetime(decoded_token['exp'])
+    # a token still queued by the token writer is written revoked; it is
+    # stored revoked here as well in case the writer is writing it already
+    token_writer.revoke(jti)
+    if _partitioned():
+        partitions.revoke(jti, decoded_token['type'],
+                          decoded_token[identity_claim], expires)
+        db.session.commit()
+    else:
+        _store_revoked(jti, decoded_token['type'],
+                       decoded_token[identity_claim], expires)
+    revocation_cache.invalidate(jti)
+    revoked_filter.add(jti)
+
+
 def unrevoke_token(token_id, user):
     """
     Unrevokes the given token. Raises a TokenNotFound error if the token does
     not exist in the database
     """
+    if _partitioned():
+        jti = partitions.set_revoked(token_id, user, False)
+        db.session.commit()
+        revocation_cache.invalidate(jti)
+        return
     try:
         token = TokenBlacklist.query.filter_by(id=token_id, user_identity=user).one()
         token.revoked = False
         db.session.commit()
+        revocation_cache.invalidate(token.jti)
     except NoResultFound:
         raise TokenNotFound("Could not find the token {}".format(token_id))
 
 
-def prune_database():
+def prune_database(batch_size=None, on_batch=None, max_batches=None):
     """
     Delete tokens that have expired from the database.
 
+    Rows are removed with set-based DELETEs of at most batch_size rows
+    (TOKEN_PRUNE_BATCH_SIZE by default), each committed on its own so locks
+    are only held briefly. Returns the number of tokens deleted.
+
+    :param on_batch: optional callable, called with the number of rows
+                     deleted and the seconds taken after every batch
+    :param max_batches: optional number of batches to stop after, leaving
+                        the rest of the expired tokens in place
+
+    In the partitioned layout whole expired buckets are dropped instead,
+    and on_batch is called once per bucket.
     """
+    if _partitioned():
+        return partitions.drop_expired_buckets(on_batch, max_batches)
+    if batch_size is None:
+        batch_size = current_app.config['TOKEN_PRUNE_BATCH_SIZE']
+    table = TokenBlacklist.__table__
     now = datetime.now()
-    expired = TokenBlacklist.query.filter(TokenBlacklist.expires < now).all()
-    for token in expired:
-        db.session.delete(token)
-    db.session.commit()
+    total = 0
+    batches = 0
+    while True:
+        started = time.time()
+        expired = select([table.c.id])\
+            .where(table.c.expires < now)\
+            .limit(batch_size)
+        deleted = db.session.execute(
+            table.delete().where(table.c.id.in_(expired))).rowcount
+        db.session.commit()
+        total += deleted
+        if on_batch is not None and deleted:
+            on_batch(deleted, time.time() - started)
+        batches += 1
+        if deleted < batch_size or batches == max_batches:
+            return total
+
+
+def count_expired_tokens():
+    """
+    Returns the number of expired tokens prune_database would delete
+    """
+    if _partitioned():
+        return partitions.count_expired()
+    return db.session.query(func.count(TokenBlacklist.id))\
+        .filter(TokenBlacklist.expires < datetime.now()).scalar()
+
+
+def bump_change_counter(name, connection=None):
+    """
+    Increments the named change counter as part of the current transaction,
+    or of connection's when given (as in mapper events)
+    """
+    table = ChangeCounter.__table__
+    execute = (connection or db.session).execute
+    result = execute(
+        table.update()
+        .where(table.c.name == name)
+        .values(value=table.c.value + 1))
+    if not result.rowcount:
+        execute(table.insert().values(name=name, value=1))
+
+
+def get_change_counter(name):
+    """
+    Returns the current value of the named change counter
+    """
+    value = db.session.query(ChangeCounter.value).filter_by(name=name).scalar()
+    return value or 0
+
+
+def get_user_by_email(email):
+    """
+    Returns the user with the given email, or None. The user is remembered
+    for the rest of the request, so the JWT user loader and decorators such
+    as admin_required share one lookup.
+
+    When the user cache is enabled, a UserIdentity (id, email and admin flag)
+    is returned from the cache instead of querying the database.
+    """
+    users = g.setdefault('users_by_email', {})
+    if email in users:
+        return users[email]
+    user = user_cache.get(email)
+    if user is None:
+        user = User.query.filter_by(email=email).first()
+        if user is not None:
+            user_cache.set(email, UserIdentity(user.id, user.email, user.admin))
+    users[email] = user
+    return user
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_cached_user(mapper, connection, target):
+    emails = set(inspect(target).attrs.email.history.deleted)
+    emails.add(target.email)
+    for email in emails:
+        user_cache.invalidate(email)
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _bump_users_counter(mapper, connection, target):
+    # users are included in farm documents, whose ETags follow this counter
+    bump_change_counter('users', connection)
@@ -0,0 +1,359 @@
+"""
+app.metrics
+~~~~~~~~~~~
+
+Request, database and hashing metrics in the Prometheus text format
+
+Metrics are histograms, apart from the hit and miss counters of the
+in-process caches, which are read from the caches themselves. Observations
+go to a shard owned by the observing thread, so recording one takes no
+lock; shards are only merged when the metrics are read.
+
+With METRICS_DIR set, each process also writes its totals to a file of its
+own in that directory, at most every METRICS_FLUSH_INTERVAL seconds and
+whenever it serves the metrics, and the metrics served are the sum over all
+the files. The files of processes that have exited are kept so that totals
+never go down; empty the directory when the application is deployed.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from functools import wraps
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+FAST_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                0.1, 0.5)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# name: (help, buckets)
+HISTOGRAMS = {
+    'http_request_duration_seconds': (
+        'Request latency by endpoint', LATENCY_BUCKETS),
+    'db_queries_per_request': (
+        'SQL statements run per request by endpoint', COUNT_BUCKETS),
+    'db_query_seconds_per_request': (
+        'Time spent in SQL statements per request by endpoint',
+        LATENCY_BUCKETS),
+    'db_pool_checkout_duration_seconds': (
+        'Time taken to get a connection from the pool', FAST_BUCKETS),
+    'password_hash_duration_seconds': (
+        'bcrypt time by operation, not counting time queued for a worker',
+        LATENCY_BUCKETS),
+    'revocation_check_duration_seconds': (
+        'Time taken to check whether a token is revoked', FAST_BUCKETS),
+}
+
+# name: help; labelled with the cache name
+COUNTERS = {
+    'cache_hits_total': 'Lookups answered by an in-process cache',
+    'cache_misses_total': 'Lookups an in-process cache could not answer',
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Registry(object):
+    """
+    Histograms recorded by every thread of the process
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        self.flush_interval = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        self._retired = {}
+        self._flushed = 0
+        self._file = None
+        self.caches = {}
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def observe(self, name, value, labels=()):
+        """
+        Records value in the histogram name for the given (name, value)
+        label pairs
+        """
+        if not self.enabled:
+            return
+        buckets = HISTOGRAMS[name][1]
+        key = (name, labels)
+        shard = self._shard()
+        values = shard.get(key)
+        if values is None:
+            values = shard[key] = [0, 0.0] + [0] * len(buckets)
+        values[0] += 1
+        values[1] += value
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                values[2 + i] += 1
+                break
+
+    def local_totals(self):
+        """
+        Returns the histograms of this process as {(name, labels): [count,
+        sum, per-bucket counts...]}, folding those of finished threads into
+        one shard
+        """
+        with self._lock:
+            alive = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    _merge(self._retired, dict(shard))
+            self._shards = alive
+            totals = {}
+            _merge(totals, self._retired)
+            for _, shard in alive:
+                _merge(totals, dict(shard))
+        for name, cache in self.caches.items():
+            stats = cache.stats
+            labels = (('cache', name),)
+            totals[('cache_hits_total', labels)] = [stats['hits']]
+            totals[('cache_misses_total', labels)] = [stats['misses']]
+        return totals
+
+    def totals(self):
+        """
+        Returns the histograms of every process writing to METRICS_DIR, or
+        of this process alone
+        """
+        if self.directory is None:
+            return self.local_totals()
+        self.flush()
+        totals = {}
+        for filename in os.listdir(self.directory):
+            if not filename.startswith('metrics-') or \
+                    not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    entries = json.load(f)
+            except (IOError, ValueError):
+                # being replaced, or written by an unrelated program
+                continue
+            _merge(totals, dict(
+                ((name, tuple(tuple(pair) for pair in labels)), values)
+                for name, labels, values in entries))
+        return totals
+
+    def flush(self):
+        """
+        Writes the totals of this process to its file in METRICS_DIR
+        """
+        if self.directory is None:
+            return
+        self._flushed = time.time()
+        entries = [[name, labels, values]
+                   for (name, labels), values in self.local_totals().items()]
+        path = os.path.join(self.directory, self._file)
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(entries, f)
+        os.replace(temporary, path)
+
+    def maybe_flush(self):
+        if self.directory is not None and \
+                time.time() - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def reset(self):
+        """
+        Forgets everything recorded, as after a fork: the parent reports
+        what it recorded itself
+        """
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        self._retired = {}
+        self._file = 'metrics-{}-{}.json'.format(os.getpid(),
+                                                 uuid.uuid4().hex[:8])
+
+
+def _merge(totals, shard):
+    for key, values in shard.items():
+        merged = totals.get(key)
+        if merged is None:
+            totals[key] = list(values)
+            continue
+        for i, value in enumerate(values):
+            merged[i] += value
+
+
+registry = Registry()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=registry.reset)
+
+
+def timed(name, **labels):
+    """
+    Records the run time of the decorated function in the histogram name
+    """
+    labels = tuple(sorted(labels.items()))
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                registry.observe(name, time.perf_counter() - started, labels)
+        return wrapper
+    return decorator
+
+
+def time_checkouts(engine):
+    """
+    Records how long getting a connection from engine's pool takes, which
+    includes waiting for one to be checked in when the pool is exhausted
+    """
+    def wrap(pool):
+        connect = pool.connect
+
+        def timed_connect():
+            if not registry.enabled:
+                return connect()
+            started = time.perf_counter()
+            try:
+                return connect()
+            finally:
+                registry.observe('db_pool_checkout_duration_seconds',
+                                 time.perf_counter() - started)
+        pool.connect = timed_connect
+
+    wrap(engine.pool)
+    # dispose() replaces the pool
+    event.listen(engine, 'engine_disposed', lambda engine: wrap(engine.pool))
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    # kept on the statement's execution context, so that a statement that
+    # fails, and never reaches after_cursor_execute, leaves nothing behind
+    if registry.enabled and context is not None:
+        context.metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    started = getattr(context, 'metrics_started', None)
+    if started is None:
+        return
+    del context.metrics_started
+    elapsed = time.perf_counter() - started
+    queries = g.get('metrics_queries') if has_request_context() else None
+    if queries is not None:
+        queries[0] += 1
+        queries[1] += elapsed
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_queries = [0, 0.0]
+
+
+def _finish_request(response):
+    started = g.get('metrics_started')
+    if started is None:
+        return response
+    labels = (('endpoint', request.endpoint or 'unmatched'),
+              ('method', request.method),
+              ('status', str(response.status_code)))
+    registry.observe('http_request_duration_seconds',
+                     time.perf_counter() - started, labels)
+    queries = g.metrics_queries
+    registry.observe('db_queries_per_request', queries[0], labels[:1])
+    registry.observe('db_query_seconds_per_request', queries[1], labels[:1])
+    registry.maybe_flush()
+    return response
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, _escape(value))
+                          for name, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float) and value == int(value) and \
+            abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def render(totals):
+    """
+    Returns metric totals in the Prometheus text exposition format
+    """
+    lines = []
+    for name in sorted(COUNTERS):
+        lines.append('# HELP {} {}'.format(name, COUNTERS[name]))
+        lines.append('# TYPE {} counter'.format(name))
+        for (metric, labels), values in sorted(totals.items()):
+            if metric == name:
+                lines.append('{}{} {}'.format(name, _labels(labels),
+                                              _number(values[0])))
+    for name in sorted(HISTOGRAMS):
+        help_text, buckets = HISTOGRAMS[name]
+        lines.append('# HELP {} {}'.format(name, help_text))
+        lines.append('# TYPE {} histogram'.format(name))
+        for (metric, labels), values in sorted(totals.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for i, bound in enumerate(buckets):
+                cumulative += values[2 + i]
+                lines.append('{}_bucket{} {}'.format(
+                    name, _labels(labels + (('le', _number(float(bound))),)),
+                    cumulative))
+            lines.append('{}_bucket{} {}'.format(
+                name, _labels(labels + (('le', '+Inf'),)), values[0]))
+            lines.append('{}_sum{} {}'.format(name, _labels(labels),
+                                              _number(values[1])))
+            lines.append('{}_count{} {}'.format(name, _labels(labels),
+                                                values[0]))
+    return '\n'.join(lines) + '\n'
+
+
+def register_cache(name, cache):
+    """
+    Exports the hit and miss counts of a TTLCache under the given name
+    """
+    registry.caches[name] = cache
+
+
+def init_app(app):
+    registry.enabled = app.config['METRICS_ENABLED']
+    registry.directory = app.config['METRICS_DIR']
+    registry.flush_interval = app.config['METRICS_FLUSH_INTERVAL']
+    if registry._file is None:
+        registry.reset()
+    if registry.enabled:
+        app.before_request(_start_request)
+        app.after_request(_finish_request)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from . import db, bcrypt
+from . import db, hasher
 
 
 class User(db.Model):
@@ -18,10 +18,14 @@ class User(db.Model):
     farm = db.relationship('Farm', backref='farms', lazy='dynamic')
 
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = hasher.generate_password_hash(password)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return hasher.check_password_hash(self.password_hash, password)
+
+    @property
+    def password_needs_rehash(self):
+        return hasher.needs_rehash(self.password_hash)
 
     @property
     def serialize(self):
@@ -42,9 +46,15 @@ class User(db.Model):
 class Farm(db.Model):
 
     __tablename__ = 'farms'
+    __table_args__ = (
+        db.Index('ix_farms_user_id_createdon', 'user_id', 'createdon'),
+        db.Index('ix_farms_stage_createdon', 'stage', 'createdon'),
+        db.Index('ix_farms_active_createdon', 'active', 'createdon'),
+        db.Index('ix_farms_location_createdon', 'location', 'createdon'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(64))
+    name = db.Column(db.String(64), index=True)
     description = db.Column(db.String(300))
     stage = db.Column(db.String(64), default="closed") # open/closed
     harvest_time = db.Column(db.DateTime) # year, month, day
@@ -54,6 +64,13 @@ class Farm(db.Model):
     active = db.Column(db.Boolean, default=False) # operates when active only
     createdon = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    # geohash of (latitude, longitude), for radius queries; see app.geo
+    geohash = db.Column(db.String(12), index=True)
+    # bumped on every update; used to build the farm's ETag
+    version = db.Column(db.Integer, nullable=False, default=1,
+                        server_default='1')
 
     @property
     def serialize(self):
@@ -61,6 +78,8 @@ class Farm(db.Model):
         return {'id': self.id,
                 'name': self.name,
                 'location': self.location,
+                'latitude': self.latitude,
+                'longitude': self.longitude,
                 'units': self.units,
                 'active': self.active,
                 'harvest_time': self.harvest_time and self.harvest_time.strftime('%a, %d %b %Y'),
@@ -80,11 +99,11 @@ class TokenBlacklist(db.Model):
     __tablename__ = 'token_blacklist'
 
     id = db.Column(db.Integer, primary_key=True)
-    jti = db.Column(db.String(50), nullable=False)
+    jti = db.Column(db.String(50), nullable=False, index=True, unique=True)
     token_type = db.Column(db.String(10), nullable=False)
     user_identity = db.Column(db.String(50), nullable=False)
     revoked = db.Column(db.Boolean, nullable=False)
-    expires = db.Column(db.DateTime, nullable=False)
+    expires = db.Column(db.DateTime, nullable=False, index=True)
 
     @property
     def serialize(self):
@@ -96,3 +115,38 @@ class TokenBlacklist(db.Model):
             'revoked': self.revoked,
             'expires': self.expires.strftime('%a, %d %b %Y %H:%M %p')
         }
+
+
+class ChangeCounter(db.Model):
+    """
+    A named counter bumped whenever the data it tracks changes, e.g. the
+    'farms' counter for any write to the farms table
+    """
+
+    __tablename__ = 'change_counters'
+
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+class FarmStat(db.Model):
+    """
+    Running totals of the farms in one (location, stage, active) group,
+    kept up to date by every write to the farms table. A group may be split
+    over several rows by concurrent first inserts, so they are read summed.
+    """
+
+    __tablename__ = 'farm_stats'
+    __table_args__ = (
+        db.Index('ix_farm_stats_group', 'location', 'stage', 'active'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    location = db.Column(db.String(64))
+    stage = db.Column(db.String(64))
+    active = db.Column(db.Boolean)
+    farms = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    margin_sum = db.Column(db.Float, nullable=False, default=0)
+    # farms with a margin, for averaging margin_sum
+    margin_count = db.Column(db.Integer, nullable=False, default=0)
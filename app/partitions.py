@@ -0,0 +1,284 @@
+"""
+app.partitions
+~~~~~~~~~~~~~~
+
+Time-partitioned token store
+
+With TOKEN_STORE_LAYOUT = 'partitioned', tokens are not kept in the single
+token_blacklist table but in one bucket per expiry day, named
+token_blacklist_pYYYYMMDD. A token's expiry is fixed when it is issued, so it
+never changes bucket, and retiring expired tokens means dropping whole
+buckets rather than deleting rows. On Postgres the buckets are daily
+partitions of the token_store table created by the migrations; on other
+databases they are plain tables created on first use.
+
+Row ids are only unique within a bucket, so tokens in this layout are
+addressed as '<YYYYMMDD>-<id>'.
+"""
+import threading
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import (
+    Boolean, Column, DateTime, Integer, MetaData, String, Table, func,
+    inspect, literal, select, text, union_all
+)
+from sqlalchemy.exc import SQLAlchemyError
+
+from . import db
+from .exceptions import TokenNotFound
+
+BUCKET_PREFIX = 'token_blacklist_p'
+BUCKET_FORMAT = '%Y%m%d'
+
+# Bucket tables live outside db.metadata so that create_all and autogenerate
+# leave them alone
+_metadata = MetaData()
+_buckets = set()
+_lock = threading.Lock()
+
+
+class PartitionedToken(namedtuple('PartitionedToken', [
+        'bucket', 'id', 'jti', 'token_type', 'user_identity', 'revoked',
+        'expires'])):
+    """
+    A token row read from a bucket
+    """
+
+    @property
+    def token_id(self):
+        return '{}-{}'.format(self.bucket, self.id)
+
+    @property
+    def serialize(self):
+        return {
+            'token_id': self.token_id,
+            'jti': self.jti,
+            'token_type': self.token_type,
+            'user_identity': self.user_identity,
+            'revoked': self.revoked,
+            'expires': self.expires.strftime('%a, %d %b %Y %H:%M %p')
+        }
+
+
+def _bucket_table(bucket):
+    name = BUCKET_PREFIX + bucket
+    table = _metadata.tables.get(name)
+    if table is None:
+        table = Table(
+            name, _metadata,
+            Column('id', Integer, primary_key=True),
+            Column('jti', String(50), nullable=False, index=True),
+            Column('token_type', String(10), nullable=False),
+            Column('user_identity', String(50), nullable=False, index=True),
+            Column('revoked', Boolean, nullable=False),
+            Column('expires', DateTime, nullable=False),
+        )
+    return table
+
+
+def _bucket_of(expires):
+    return expires.strftime(BUCKET_FORMAT)
+
+
+def _load_buckets():
+    names = inspect(db.engine).get_table_names()
+    buckets = set(name[len(BUCKET_PREFIX):] for name in names
+                  if name.startswith(BUCKET_PREFIX))
+    with _lock:
+        _buckets.clear()
+        _buckets.update(buckets)
+    return sorted(buckets)
+
+
+def _create_bucket(bucket):
+    engine = db.engine
+    with engine.begin() as connection:
+        if engine.dialect.name == 'postgresql':
+            start = datetime.strptime(bucket, BUCKET_FORMAT).date()
+            connection.execute(text(
+                "CREATE TABLE IF NOT EXISTS {} PARTITION OF token_store "
+                "FOR VALUES FROM ('{}') TO ('{}')".format(
+                    BUCKET_PREFIX + bucket, start.isoformat(),
+                    (start + timedelta(days=1)).isoformat())))
+        else:
+            _bucket_table(bucket).create(connection, checkfirst=True)
+
+
+def _writable_bucket(expires):
+    """
+    Returns the bucket table for tokens expiring at expires, creating it on
+    a separate connection if it does not exist yet
+    """
+    bucket = _bucket_of(expires)
+    if bucket not in _buckets:
+        with _lock:
+            if bucket not in _buckets:
+                try:
+                    _create_bucket(bucket)
+                except SQLAlchemyError:
+                    # another process may have created it first
+                    if not db.engine.has_table(BUCKET_PREFIX + bucket):
+                        raise
+                _buckets.add(bucket)
+    return _bucket_table(bucket)
+
+
+def _existing_bucket(bucket):
+    if bucket not in _buckets and bucket not in _load_buckets():
+        return None
+    return _bucket_table(bucket)
+
+
+def _token(bucket, row):
+    return PartitionedToken(bucket, row.id, row.jti, row.token_type,
+                            row.user_identity, row.revoked, row.expires)
+
+
+def add_token(jti, token_type, user_identity, expires, revoked=False):
+    add_tokens([{'jti': jti, 'token_type': token_type,
+                 'user_identity': user_identity, 'expires': expires,
+                 'revoked': revoked}])
+
+
+def add_tokens(rows, skip_existing=False):
+    """
+    Inserts token rows (dicts of column values) into their buckets with one
+    statement per bucket, leaving out the jtis already stored when
+    skip_existing is set
+    """
+    by_bucket = {}
+    for row in rows:
+        by_bucket.setdefault(_bucket_of(row['expires']), []).append(row)
+    # create any missing buckets before writing to the session
+    tables = [(_writable_bucket(bucket_rows[0]['expires']), bucket_rows)
+              for bucket_rows in by_bucket.values()]
+    for table, bucket_rows in tables:
+        if skip_existing:
+            stored = set(jti for (jti,) in db.session.execute(
+                select([table.c.jti]).where(table.c.jti.in_(
+                    [row['jti'] for row in bucket_rows]))))
+            bucket_rows = [row for row in bucket_rows
+                           if row['jti'] not in stored]
+        if bucket_rows:
+            db.session.execute(table.insert(), bucket_rows)
+
+
+def find_token(jti, expires):
+    """
+    Returns the stored token with the given jti, looking only in the bucket
+    for its expiry
+    """
+    bucket = _bucket_of(expires)
+    table = _existing_bucket(bucket)
+    if table is None:
+        return None
+    # buckets have no unique jti constraint; should a token have been
+    # stored twice, a revoked row wins
+    row = db.session.execute(
+        select([table]).where(table.c.jti == jti)
+        .order_by(table.c.revoked.desc())).first()
+    return row and _token(bucket, row)
+
+
+def revoke(jti, token_type, user_identity, expires):
+    """
+    Marks the token revoked, storing it first if it is not in its bucket
+    """
+    table = _writable_bucket(expires)
+    updated = db.session.execute(
+        table.update().where(table.c.jti == jti).values(revoked=True))
+    if not updated.rowcount:
+        add_token(jti, token_type, user_identity, expires, revoked=True)
+
+
+def set_revoked(token_id, user_identity, revoked):
+    """
+    Sets the revoked status of the token with the given '<bucket>-<id>' id
+    belonging to user_identity and returns its jti. Raises TokenNotFound if
+    there is no such token.
+    """
+    bucket, _, row_id = str(token_id).partition('-')
+    table = None
+    if row_id.isdigit():
+        table = _existing_bucket(bucket)
+    if table is None:
+        raise TokenNotFound("Could not find the token {}".format(token_id))
+    condition = (table.c.id == int(row_id)) & \
+        (table.c.user_identity == user_identity)
+    jti = db.session.execute(select([table.c.jti]).where(condition)).scalar()
+    if jti is None:
+        raise TokenNotFound("Could not find the token {}".format(token_id))
+    db.session.execute(table.update().where(condition).values(revoked=revoked))
+    return jti
+
+
+def _union(columns, where=None):
+    queries = []
+    for bucket in _load_buckets():
+        table = _bucket_table(bucket)
+        query = select([literal(bucket).label('bucket')] +
+                       [table.c[column] for column in columns])
+        if where is not None:
+            query = query.where(where(table))
+        queries.append(query)
+    return queries
+
+
+def get_user_tokens(user_identity):
+    columns = ['id', 'jti', 'token_type', 'user_identity', 'revoked',
+               'expires']
+    queries = _union(columns, lambda table:
+                     table.c.user_identity == user_identity)
+    if not queries:
+        return []
+    rows = db.session.execute(union_all(*queries)).fetchall()
+    return [_token(row.bucket, row) for row in rows]
+
+
+def all_jtis():
+    queries = _union(['jti'])
+    if not queries:
+        return []
+    return [row.jti for row in db.session.execute(union_all(*queries))]
+
+
+def _expired_buckets():
+    today = date.today().strftime(BUCKET_FORMAT)
+    return [bucket for bucket in _load_buckets() if bucket < today]
+
+
+def drop_expired_buckets(on_batch=None, max_buckets=None):
+    """
+    Drops every bucket whose tokens have all expired, oldest first and at
+    most max_buckets of them, and returns the number of tokens they held.
+    on_batch is called with the row count and seconds taken for each bucket
+    dropped.
+    """
+    total = 0
+    # DDL runs on its own connection; don't hold locks it may wait for
+    db.session.commit()
+    for bucket in _expired_buckets()[:max_buckets]:
+        started = time.time()
+        table = _bucket_table(bucket)
+        with db.engine.begin() as connection:
+            count = connection.execute(
+                select([func.count()]).select_from(table)).scalar()
+            table.drop(connection)
+        with _lock:
+            _buckets.discard(bucket)
+        total += count
+        if on_batch is not None:
+            on_batch(count, time.time() - started)
+    return total
+
+
+def count_expired():
+    """
+    Returns the number of tokens in the buckets drop_expired_buckets would
+    drop
+    """
+    return sum(db.session.execute(
+        select([func.count()]).select_from(_bucket_table(bucket))).scalar()
+        for bucket in _expired_buckets())
@@ -0,0 +1,198 @@
+"""
+app.profiling
+~~~~~~~~~~~~~
+
+Per-request SQL profiling for development and staging
+
+With PROFILE_QUERIES set, every SQL statement a request runs is recorded
+with its parameters, duration and the application line that issued it. At
+the end of the request the statements are checked for:
+
+- identical statements (same SQL and parameters) run more than once, which
+  should come from one query or the session's identity map;
+- one statement run PROFILE_N_PLUS_ONE_THRESHOLD times or more with
+  different parameters, the usual shape of an N+1 query;
+- statements slower than PROFILE_SLOW_QUERY_MS, whose EXPLAIN plan is
+  captured when PROFILE_EXPLAIN is set.
+
+A summary is logged for every request, as a warning when something was
+flagged, and with PROFILE_REPORT_DIR set the full report is also written
+there as one JSON file per request. When a request runs more statements
+than PROFILE_QUERY_BUDGET, QueryBudgetExceeded is raised under TESTING so
+that the test fails, and an error is logged otherwise.
+"""
+import json
+import os
+import time
+import traceback
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .exceptions import QueryBudgetExceeded
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# longest parameter repr kept in reports
+MAX_PARAMETERS_LENGTH = 200
+
+EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+}
+
+EXPLAIN_SAVEPOINT = 'profile_explain'
+
+
+def _location():
+    """
+    Returns the innermost application frame outside this module, as
+    'path:line in function'
+    """
+    for frame in reversed(traceback.extract_stack()[:-1]):
+        filename = frame[0]
+        if filename.startswith(APP_ROOT) and filename != __file__:
+            return '{}:{} in {}'.format(
+                os.path.relpath(filename, os.path.dirname(APP_ROOT)),
+                frame[1], frame[2])
+    return None
+
+
+def _explain(conn, cursor, statement, parameters):
+    """
+    Returns the plan of a slow SELECT, run on a separate cursor of the same
+    DBAPI connection so that it bypasses these engine events. It runs in a
+    savepoint: on Postgres a failed EXPLAIN would otherwise abort the
+    request's transaction.
+    """
+    prefix = EXPLAIN_PREFIXES.get(conn.dialect.name)
+    keyword = statement.lstrip().split(None, 1)[0].upper()
+    if prefix is None or keyword not in ('SELECT', 'WITH'):
+        return None
+    explain_cursor = cursor.connection.cursor()
+    try:
+        explain_cursor.execute('SAVEPOINT ' + EXPLAIN_SAVEPOINT)
+        try:
+            explain_cursor.execute(prefix + statement, parameters)
+            plan = [' '.join(str(value) for value in row)
+                    for row in explain_cursor.fetchall()]
+        except Exception as e:
+            explain_cursor.execute(
+                'ROLLBACK TO SAVEPOINT ' + EXPLAIN_SAVEPOINT)
+            plan = ['EXPLAIN failed: {}'.format(e)]
+        explain_cursor.execute('RELEASE SAVEPOINT ' + EXPLAIN_SAVEPOINT)
+        return plan
+    finally:
+        explain_cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    # on the execution context, which a failing statement takes with it
+    if context is not None and has_request_context() and \
+            g.get('profile') is not None:
+        context.profile_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    started = getattr(context, 'profile_started', None)
+    if started is None:
+        return
+    del context.profile_started
+    duration = (time.perf_counter() - started) * 1000
+    profile = g.get('profile')
+    if profile is None:
+        return
+    config = current_app.config
+    entry = {
+        'statement': statement,
+        'parameters': repr(parameters)[:MAX_PARAMETERS_LENGTH],
+        'duration_ms': round(duration, 3),
+        'location': _location(),
+        'slow': duration >= config['PROFILE_SLOW_QUERY_MS'],
+    }
+    if entry['slow'] and config['PROFILE_EXPLAIN'] and not executemany:
+        entry['explain'] = _explain(conn, cursor, statement, parameters)
+    profile.append(entry)
+
+
+def _start_request():
+    g.profile = []
+
+
+def build_report(queries, n_plus_one_threshold):
+    """
+    Returns the report of the statements run by a request: totals, the
+    statements repeated identically, the statements repeated with different
+    parameters at least n_plus_one_threshold times, and the slow ones
+    """
+    identical = Counter((query['statement'], query['parameters'])
+                        for query in queries)
+    shapes = Counter(query['statement'] for query in queries)
+    repeated = [{'statement': statement, 'parameters': parameters,
+                 'count': count}
+                for (statement, parameters), count in identical.items()
+                if count > 1]
+    n_plus_one = [{'statement': statement, 'count': count}
+                  for statement, count in shapes.items()
+                  if count >= n_plus_one_threshold]
+    return {
+        'query_count': len(queries),
+        'query_time_ms': round(sum(query['duration_ms']
+                                   for query in queries), 3),
+        'repeated': repeated,
+        'n_plus_one': n_plus_one,
+        'slow': [query for query in queries if query['slow']],
+        'queries': queries,
+    }
+
+
+def _write_report(directory, report):
+    filename = '{:.6f}-{}.json'.format(
+        time.time(), (report['endpoint'] or 'unmatched').replace('/', '_'))
+    with open(os.path.join(directory, filename), 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def _finish_request(response):
+    queries = g.pop('profile', None)
+    if queries is None:
+        return response
+    config = current_app.config
+    report = build_report(queries, config['PROFILE_N_PLUS_ONE_THRESHOLD'])
+    path = request.full_path.rstrip('?')
+    report.update(method=request.method, path=path,
+                  endpoint=request.endpoint, status=response.status_code)
+    flagged = report['repeated'] or report['n_plus_one'] or report['slow']
+    log = current_app.logger.warning if flagged else current_app.logger.info
+    log('%s %s: %d queries in %.1fms, %d repeated, %d possible N+1, '
+        '%d slow', request.method, path, report['query_count'],
+        report['query_time_ms'], len(report['repeated']),
+        len(report['n_plus_one']), len(report['slow']))
+    if config['PROFILE_REPORT_DIR']:
+        _write_report(config['PROFILE_REPORT_DIR'], report)
+    budget = config['PROFILE_QUERY_BUDGET']
+    if budget is not None and report['query_count'] > budget:
+        message = '{} {} ran {} queries, over the budget of {}'.format(
+            request.method, path, report['query_count'], budget)
+        if current_app.testing:
+            raise QueryBudgetExceeded(message)
+        current_app.logger.error(message)
+    return response
+
+
+def init_app(app):
+    if not app.config['PROFILE_QUERIES']:
+        return
+    if not event.contains(Engine, 'before_cursor_execute',
+                          _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    if app.config['PROFILE_REPORT_DIR']:
+        os.makedirs(app.config['PROFILE_REPORT_DIR'], exist_ok=True)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -0,0 +1,100 @@
+"""
+app.routing
+~~~~~~~~~~~
+
+Read-replica routing
+
+With SQLALCHEMY_REPLICA_URIS set, the session of a GET, HEAD or OPTIONS
+request reads from the replicas, taking them in turn per request. Writes,
+flushes and everything outside requests (the CLI, background threads) use
+the primary, as do the functions decorated with on_primary, such as the
+token revocation check.
+
+A response to any other request sets a short-lived cookie that sends the
+client's next requests to the primary for REPLICA_STICKY_SECONDS, so that
+it reads its own writes whatever the replication lag.
+"""
+import itertools
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from .metrics import time_checkouts
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_COOKIE = 'read_primary'
+
+
+class RoutingSession(SignallingSession):
+    """
+    Session that binds to a replica while the current request reads from
+    one
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        replica = g.get('replica') if has_request_context() else None
+        if replica is not None and not self._flushing:
+            return replica
+        return SignallingSession.get_bind(self, mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """
+    Flask-SQLAlchemy with read-replica routing
+    """
+
+    def create_session(self, options):
+        return sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def create_engine(self, sa_url, engine_opts):
+        engine = SQLAlchemy.create_engine(self, sa_url, engine_opts)
+        time_checkouts(engine)
+        return engine
+
+    def init_app(self, app):
+        SQLAlchemy.init_app(self, app)
+        options = app.config['SQLALCHEMY_REPLICA_ENGINE_OPTIONS']
+        engines = [create_engine(uri, **options)
+                   for uri in app.config['SQLALCHEMY_REPLICA_URIS']]
+        for engine in engines:
+            time_checkouts(engine)
+        app.extensions['replicas'] = itertools.cycle(engines) \
+            if engines else None
+        if engines:
+            app.before_request(_route_request)
+            app.after_request(_stick_to_primary)
+
+
+def _route_request():
+    if request.method in SAFE_METHODS and \
+            STICKY_COOKIE not in request.cookies:
+        g.replica = next(current_app.extensions['replicas'])
+
+
+def _stick_to_primary(response):
+    if request.method not in SAFE_METHODS:
+        response.set_cookie(STICKY_COOKIE, '1', httponly=True,
+                            max_age=current_app.config[
+                                'REPLICA_STICKY_SECONDS'])
+    return response
+
+
+def on_primary(fn):
+    """
+    Makes the decorated function read from the primary even in requests
+    routed to a replica
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not has_request_context():
+            return fn(*args, **kwargs)
+        replica = g.pop('replica', None)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if replica is not None:
+                g.replica = replica
+    return wrapper
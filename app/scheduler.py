@@ -0,0 +1,52 @@
+"""
+app.scheduler
+~~~~~~~~~~~~~
+
+A minimal in-process scheduler for periodic maintenance tasks
+
+"""
+import threading
+import time
+
+
+class PeriodicTask(threading.Thread):
+    """
+    Calls fn inside an application context every interval seconds on a
+    daemon thread. Errors are logged and the task carries on.
+    """
+
+    def __init__(self, app, interval, fn, name):
+        super(PeriodicTask, self).__init__(name=name)
+        self.daemon = True
+        self.app = app
+        self.interval = interval
+        self.fn = fn
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            started = time.time()
+            with self.app.app_context():
+                try:
+                    result = self.fn()
+                    self.app.logger.info('%s: %s in %.3fs', self.name,
+                                         result, time.time() - started)
+                except Exception:
+                    self.app.logger.exception('%s failed', self.name)
+
+    def stop(self):
+        self._stopped.set()
+
+
+def init_app(app):
+    """
+    Starts the periodic tasks enabled in the application config
+    """
+    interval = app.config['TOKEN_PRUNE_INTERVAL']
+    if interval:
+        from .helpers import prune_database
+
+        def prune():
+            return '{} expired tokens pruned'.format(prune_database())
+
+        PeriodicTask(app, interval, prune, 'token-pruner').start()
@@ -0,0 +1,118 @@
+"""
+app.search
+~~~~~~~~~~
+
+Full-text search over farm names and descriptions
+
+On PostgreSQL farms are matched against an expression GIN index over the
+tsvector of their name and description and ranked with ts_rank. SQLite (for
+local and test setups) uses the farms_fts FTS5 table, kept in step with
+farms by triggers and ranked with bm25. Both are created along with the
+farms table and by the migrations, and both stay current on every insert,
+update and delete, however it is made.
+"""
+import re
+
+from sqlalchemy import DDL, Float, cast, event, func, literal_column
+from sqlalchemy.sql import column, table
+
+from . import db
+from .exceptions import InvalidQueryParameter
+from .models import Farm
+
+# Text search configuration of the PostgreSQL index; queries must use the
+# same one for the index to apply
+SEARCH_CONFIG = "'english'"
+
+# The farms_fts FTS5 table, as far as queries need it
+farms_fts = table('farms_fts', column('rowid'))
+
+POSTGRESQL_DDL = [
+    "CREATE INDEX ix_farms_search ON farms USING gin (to_tsvector({}, "
+    "coalesce(name, '') || ' ' || coalesce(description, '')))".format(
+        SEARCH_CONFIG),
+]
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE farms_fts USING fts5(name, description, "
+    "content='farms', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER farms_fts_insert AFTER INSERT ON farms BEGIN "
+    "INSERT INTO farms_fts (rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER farms_fts_delete AFTER DELETE ON farms BEGIN "
+    "INSERT INTO farms_fts (farms_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER farms_fts_update AFTER UPDATE OF name, description "
+    "ON farms BEGIN "
+    "INSERT INTO farms_fts (farms_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO farms_fts (rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+]
+
+for statement in POSTGRESQL_DDL:
+    event.listen(Farm.__table__, 'after_create',
+                 DDL(statement).execute_if(dialect='postgresql'))
+for statement in SQLITE_DDL:
+    event.listen(Farm.__table__, 'after_create',
+                 DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Farm.__table__, 'before_drop',
+             DDL('DROP TABLE IF EXISTS farms_fts').execute_if(
+                 dialect='sqlite'))
+
+
+def _terms(text):
+    terms = re.findall(r'\w+', text, re.UNICODE)
+    if not terms:
+        raise InvalidQueryParameter("filter[q] should contain at least one "
+                                    "word")
+    return terms
+
+
+def _dialect():
+    name = db.session.get_bind().dialect.name
+    if name not in ('postgresql', 'sqlite'):
+        raise InvalidQueryParameter("Searching is not supported on this "
+                                    "database")
+    return name
+
+
+def _document():
+    # must match the expression of ix_farms_search
+    return func.to_tsvector(
+        literal_column(SEARCH_CONFIG),
+        func.coalesce(Farm.name, literal_column("''")) +
+        literal_column("' '") +
+        func.coalesce(Farm.description, literal_column("''")))
+
+
+def _tsquery(terms):
+    return func.plainto_tsquery(literal_column(SEARCH_CONFIG),
+                                ' '.join(terms))
+
+
+def match_farms(query, text):
+    """
+    Restricts query, which selects farm columns, to the farms whose name or
+    description contain every word of text
+    """
+    terms = _terms(text)
+    if _dialect() == 'postgresql':
+        return query.filter(_document().op('@@')(_tsquery(terms)))
+    return query.join(farms_fts, farms_fts.c.rowid == Farm.id).filter(
+        literal_column('farms_fts').op('MATCH')(
+            ' '.join('"{}"'.format(term) for term in terms)))
+
+
+def search_rank(text):
+    """
+    Returns the relevance of a farm to the words of text, higher being more
+    relevant, for queries restricted with match_farms
+    """
+    terms = _terms(text)
+    if _dialect() == 'postgresql':
+        # double precision, so that page cursors compare exactly
+        rank = cast(func.ts_rank(_document(), _tsquery(terms)), Float)
+    else:
+        rank = -func.bm25(literal_column('farms_fts'))
+    return rank.label('relevance')
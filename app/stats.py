@@ -0,0 +1,123 @@
+"""
+app.stats
+~~~~~~~~~
+
+Farm statistics summary table
+
+The farm_stats table holds the number of farms, their total units and the
+sum and count of their margins per (location, stage, active) group. Writes to
+farms update it in their own transaction with count_farms, so reading the
+statistics costs one row per group however many farms there are.
+rebuild_farm_stats recomputes it from the farms table.
+"""
+from sqlalchemy import func, select
+
+from . import db
+from .helpers import bump_change_counter
+from .models import Farm, FarmStat
+
+# Farm columns the statistics depend on
+STAT_FIELDS = ('location', 'stage', 'active', 'units', 'margin')
+
+
+def farm_stat_values(farm):
+    """
+    Returns the values of a Farm's STAT_FIELDS as a dict
+    """
+    return {field: getattr(farm, field) for field in STAT_FIELDS}
+
+
+def _add(deltas, farm, sign):
+    key = (farm.get('location'), farm.get('stage'), farm.get('active'))
+    delta = deltas.setdefault(key, [0, 0, 0.0, 0])
+    delta[0] += sign
+    delta[1] += sign * (farm.get('units') or 0)
+    if farm.get('margin') is not None:
+        delta[2] += sign * farm['margin']
+        delta[3] += sign
+
+
+def _group_order(item):
+    # None sorts before any value of the same column
+    return tuple((False, '') if value is None else (True, value)
+                 for value in item[0])
+
+
+def count_farms(added=(), removed=()):
+    """
+    Updates the statistics for the added and removed farms, given as dicts
+    of their STAT_FIELDS values (missing ones count as None), as part of the
+    current transaction. A farm that changed is removed with its old values
+    and added with the new ones. Each affected group is written once, in
+    a fixed order, so that concurrent writes lock the rows of the groups
+    they share in the same order.
+    """
+    deltas = {}
+    for farm in added:
+        _add(deltas, farm, 1)
+    for farm in removed:
+        _add(deltas, farm, -1)
+    table = FarmStat.__table__
+    for (location, stage, active), delta in sorted(deltas.items(),
+                                                   key=_group_order):
+        farms, units, margin_sum, margin_count = delta
+        if not farms and not units and not margin_sum and not margin_count:
+            continue
+        result = db.session.execute(
+            table.update()
+            .where(table.c.location == location)
+            .where(table.c.stage == stage)
+            .where(table.c.active == active)
+            .values(farms=table.c.farms + farms,
+                    units=table.c.units + units,
+                    margin_sum=table.c.margin_sum + margin_sum,
+                    margin_count=table.c.margin_count + margin_count))
+        if not result.rowcount:
+            db.session.execute(table.insert().values(
+                location=location, stage=stage, active=active, farms=farms,
+                units=units, margin_sum=margin_sum,
+                margin_count=margin_count))
+
+
+def get_farm_stats():
+    """
+    Returns the statistics of every non-empty group as rows of location,
+    stage, active, farms, units, margin_sum and margin_count
+    """
+    table = FarmStat.__table__
+    group = [table.c.location, table.c.stage, table.c.active]
+    farms = func.sum(table.c.farms)
+    query = select(group + [
+        farms.label('farms'),
+        func.sum(table.c.units).label('units'),
+        func.sum(table.c.margin_sum).label('margin_sum'),
+        func.sum(table.c.margin_count).label('margin_count'),
+    ]).group_by(*group).having(farms > 0).order_by(*group)
+    return db.session.execute(query).fetchall()
+
+
+def rebuild_farm_stats():
+    """
+    Recomputes the statistics from the farms table, commits and returns
+    the number of groups. On PostgreSQL writes to farms wait until the
+    rebuild is done.
+    """
+    farms = Farm.__table__
+    table = FarmStat.__table__
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute('LOCK TABLE farms IN SHARE MODE')
+    group = [farms.c.location, farms.c.stage, farms.c.active]
+    summary = select(group + [
+        func.count(),
+        func.coalesce(func.sum(farms.c.units), 0),
+        func.coalesce(func.sum(farms.c.margin), 0),
+        func.count(farms.c.margin),
+    ]).group_by(*group)
+    db.session.execute(table.delete())
+    db.session.execute(table.insert().from_select(
+        ['location', 'stage', 'active', 'farms', 'units', 'margin_sum',
+         'margin_count'], summary))
+    # the statistics' ETag follows the farms counter
+    bump_change_counter('farms')
+    db.session.commit()
+    return db.session.query(func.count(table.c.id)).scalar()
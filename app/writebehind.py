@@ -0,0 +1,136 @@
+"""
+app.writebehind
+~~~~~~~~~~~~~~~
+
+Write-behind queue for issued tokens
+
+"""
+import atexit
+import queue
+import threading
+import time
+
+
+class TokenWriter(object):
+    """
+    Batches the inserts of newly issued tokens from concurrent logins. Tokens
+    are queued by the request that issues them and written by a background
+    thread, up to TOKEN_WRITE_BEHIND_BATCH rows at a time, at most
+    TOKEN_WRITE_BEHIND_DELAY seconds after the first of them was queued.
+
+    A token that has been issued but not written yet is not known to the
+    database, so it is accepted while it is still queued in this process and,
+    for other processes, for TOKEN_WRITE_BEHIND_GRACE seconds after issue.
+
+    A batch that fails to write is retried one row at a time, so that one
+    bad row (such as a token revoked, and so stored, while it was queued)
+    does not lose the others.
+
+    :param write: callable that persists a list of token rows (dicts) and
+                  commits, or rolls back and raises; it is called inside an
+                  application context
+    """
+
+    def __init__(self, write):
+        self._write = write
+        self._queue = queue.Queue()
+        # jti -> queued row
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.app = None
+        self.enabled = False
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config['TOKEN_WRITE_BEHIND']
+        self.batch_size = app.config['TOKEN_WRITE_BEHIND_BATCH']
+        self.delay = app.config['TOKEN_WRITE_BEHIND_DELAY']
+        self.grace = app.config['TOKEN_WRITE_BEHIND_GRACE']
+        if self.enabled and self._thread is None:
+            self._thread = threading.Thread(target=self._run,
+                                            name='token-writer')
+            self._thread.daemon = True
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def put(self, row):
+        with self._lock:
+            self._pending[row['jti']] = row
+        self._queue.put(row)
+
+    def revoke(self, jti):
+        """
+        Marks the token with the given jti revoked if it is still queued, so
+        that it is written revoked. Returns whether it was queued.
+        """
+        with self._lock:
+            row = self._pending.get(jti)
+            if row is not None:
+                row['revoked'] = True
+        return row is not None
+
+    def accepts(self, decoded_token):
+        """
+        Tells whether a token missing from the database may just not have
+        been written yet
+        """
+        if not self.enabled:
+            return False
+        if decoded_token['jti'] in self._pending:
+            return True
+        return time.time() - decoded_token.get('iat', 0) < self.grace
+
+    def _take_batch(self):
+        rows = [self._queue.get()]
+        deadline = time.time() + self.delay
+        while len(rows) < self.batch_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                rows.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return rows
+
+    def _write_batch(self, rows):
+        with self.app.app_context():
+            try:
+                self._write(rows)
+            except Exception:
+                if len(rows) == 1:
+                    self.app.logger.exception('failed to write token %s',
+                                              rows[0]['jti'])
+                else:
+                    self.app.logger.warning(
+                        'failed to write %d tokens, retrying them one at a '
+                        'time', len(rows), exc_info=True)
+                    for row in rows:
+                        self._write_row(row)
+        with self._lock:
+            for row in rows:
+                self._pending.pop(row['jti'], None)
+
+    def _write_row(self, row):
+        try:
+            self._write([row])
+        except Exception:
+            self.app.logger.exception('failed to write token %s', row['jti'])
+
+    def _run(self):
+        while True:
+            self._write_batch(self._take_batch())
+
+    def flush(self):
+        """
+        Writes everything still queued on the calling thread
+        """
+        rows = []
+        while True:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if rows:
+            self._write_batch(rows)
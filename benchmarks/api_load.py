@@ -0,0 +1,455 @@
+"""
+benchmarks.api_load
+~~~~~~~~~~~~~~~~~~~
+
+Load-tests the API over HTTP. The application is booted with create_app
+against a database seeded with synthetic users, farms and tokens, and
+served on a local port to concurrent keep-alive clients, each signed in as
+one of the users and running a weighted mix of sign-ins, farm listing,
+reading, updating, creating and deleting, and token listing. Latency
+percentiles and requests per second are reported per endpoint and can be
+saved as JSON and compared against a baseline run, exiting with status 1
+when an endpoint regressed by more than the tolerance.
+
+    python -m benchmarks.api_load --clients 16 --duration 30 \\
+        --output results.json --baseline baseline.json
+
+The database, a temporary SQLite file unless --database-url is given, has
+its tables dropped and recreated. Use PostgreSQL for numbers that mean
+anything for production: SQLite serializes every write.
+"""
+import argparse
+import bisect
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.serving import WSGIRequestHandler, make_server  # noqa: E402
+
+from config import Config  # noqa: E402
+
+PASSWORD = 'c0rrect-horse!'
+LOCATIONS = ('Nairobi', 'Kisumu', 'Eldoret', 'Nakuru', 'Bungoma', 'Kakamega')
+WORDS = ('maize', 'beans', 'coffee', 'tea', 'avocado', 'dairy', 'sorghum',
+         'irrigated', 'terraced', 'organic', 'hillside', 'river')
+
+# operation: relative weight
+DEFAULT_MIX = {
+    'sign_in': 5,
+    'list_farms': 35,
+    'get_farm': 30,
+    'patch_farm': 10,
+    'create_delete_farm': 5,
+    'list_tokens': 15,
+}
+
+# metrics compared against a baseline, and whether higher is better
+COMPARED = (('rps', True), ('p95_ms', False))
+
+
+class QuietHandler(WSGIRequestHandler):
+    # keep-alive, and no access log on stderr
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        # without TCP_NODELAY, Nagle's algorithm and delayed ACKs add ~40ms
+        # to responses written in several sends on a kept-alive connection
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        WSGIRequestHandler.setup(self)
+
+    def log(self, *args):
+        pass
+
+
+def parse_mix(text):
+    """
+    Parses 'operation=weight,...' into a mix, defaulting to DEFAULT_MIX
+    """
+    if not text:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(
+                'unknown operation {!r}, expected one of {}'.format(
+                    name, ', '.join(sorted(DEFAULT_MIX))))
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def farm_row(user_id, rng):
+    row = {
+        'name': '{} {} farm'.format(rng.choice(WORDS).title(),
+                                    rng.choice(WORDS)),
+        'description': ' '.join(rng.choice(WORDS) for _ in range(12)),
+        'location': rng.choice(LOCATIONS),
+        'units': rng.randint(1, 500),
+        'margin': round(rng.uniform(0.05, 0.6), 2),
+        'stage': rng.choice(('open', 'closed')),
+        'active': rng.random() < 0.7,
+        'user_id': user_id,
+    }
+    if rng.random() < 0.5:
+        row['latitude'] = rng.uniform(-4.5, 4.5)
+        row['longitude'] = rng.uniform(34.0, 41.0)
+    return row
+
+
+def seed(app, users, farms, tokens, rng):
+    """
+    Fills the emptied database with users (all with PASSWORD), farms spread
+    over them and tokens issued to them. Returns the users' emails and the
+    farm ids of each user.
+    """
+    from app import db, hasher
+    from app.geo import encode
+    from app.helpers import issue_tokens
+    from app.models import Farm, User
+    from app.stats import rebuild_farm_stats
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        password_hash = hasher.generate_password_hash(PASSWORD)
+        emails = ['user{}@bench.example'.format(i) for i in range(users)]
+        db.session.bulk_insert_mappings(User, [
+            {'email': email, 'password_hash': password_hash}
+            for email in emails])
+        db.session.commit()
+        user_ids = [user_id for user_id, in db.session.query(User.id)
+                    .order_by(User.id)]
+
+        rows = []
+        for i in range(farms):
+            row = farm_row(user_ids[i % users], rng)
+            if 'latitude' in row:
+                row['geohash'] = encode(row['latitude'], row['longitude'])
+            rows.append(row)
+        for start in range(0, len(rows), 1000):
+            db.session.bulk_insert_mappings(Farm, rows[start:start + 1000])
+            db.session.commit()
+        rebuild_farm_stats()
+
+        for email in emails:
+            for _ in range(tokens):
+                issue_tokens(email)
+            db.session.commit()
+
+        farm_ids = dict((user_id, []) for user_id in user_ids)
+        for farm_id, user_id in db.session.query(Farm.id, Farm.user_id):
+            farm_ids[user_id].append(farm_id)
+        return emails, [farm_ids[user_id] for user_id in user_ids]
+
+
+class Client(object):
+    """
+    One keep-alive HTTP client signed in as one user, recording the time
+    of each of its requests
+    """
+
+    def __init__(self, port, email, farm_ids, all_farm_ids, rng, recorder):
+        self.port = port
+        self.recorder = recorder
+        self.email = email
+        self.farm_ids = list(farm_ids)
+        self.all_farm_ids = all_farm_ids
+        self.rng = rng
+        self.connection = None
+        self.token = None
+
+    def _connect(self):
+        self.connection = http.client.HTTPConnection('127.0.0.1', self.port,
+                                                     timeout=60)
+        self.connection.connect()
+        self.connection.sock.setsockopt(socket.IPPROTO_TCP,
+                                        socket.TCP_NODELAY, 1)
+
+    def request(self, endpoint, method, path, body=None):
+        """
+        Sends a request, records its time under endpoint and returns its
+        status and decoded JSON body
+        """
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = 'Bearer ' + self.token
+        data = None if body is None else json.dumps(body).encode('utf-8')
+        for attempt in (1, 2):
+            try:
+                if self.connection is None:
+                    self._connect()
+                started = time.perf_counter()
+                self.connection.request(method, path, data, headers)
+                response = self.connection.getresponse()
+                payload = response.read()
+                elapsed = time.perf_counter() - started
+                break
+            except (http.client.HTTPException, OSError):
+                # the server closed the connection; reconnect once
+                if self.connection is not None:
+                    self.connection.close()
+                self.connection = None
+                if attempt == 2:
+                    raise
+        self.recorder.add(endpoint, response.status, elapsed)
+        try:
+            payload = json.loads(payload.decode('utf-8'))
+        except ValueError:
+            payload = None
+        return response.status, payload
+
+    def sign_in(self):
+        status, payload = self.request('sign_in', 'POST', '/api/auth/login', {
+            'email': self.email, 'password': PASSWORD})
+        if status == 200:
+            self.token = payload['data'][0]['access_token']
+
+    def list_farms(self):
+        path = '/api/farms?page[size]=20'
+        if self.rng.random() < 0.3:
+            path += '&filter[location]=' + self.rng.choice(LOCATIONS)
+        self.request('list_farms', 'GET', path)
+
+    def get_farm(self):
+        farm_id = self.rng.choice(self.all_farm_ids)
+        self.request('get_farm', 'GET', '/api/farms/{}'.format(farm_id))
+
+    def patch_farm(self):
+        if not self.farm_ids:
+            return self.get_farm()
+        farm_id = self.rng.choice(self.farm_ids)
+        self.request('patch_farm', 'PATCH', '/api/farms/{}'.format(farm_id),
+                     {'units': self.rng.randint(1, 500)})
+
+    def create_delete_farm(self):
+        """
+        Creates a farm and deletes it again, so that the dataset keeps its
+        size
+        """
+        row = farm_row(None, self.rng)
+        body = dict((field, str(row[field])) for field in
+                    ('name', 'description', 'location', 'units'))
+        status, payload = self.request('create_farm', 'POST', '/api/farms',
+                                       body)
+        if status == 201:
+            farm_id = payload['data'][0]['id']
+            self.request('delete_farm', 'DELETE',
+                         '/api/farms/{}'.format(farm_id))
+
+    def list_tokens(self):
+        self.request('list_tokens', 'GET', '/api/auth/tokens')
+
+
+class Recorder(object):
+    """
+    Latencies and error counts per endpoint, shared by all clients
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.recording = False
+
+    def add(self, endpoint, status, seconds):
+        if not self.recording:
+            return
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            if status >= 400:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+def run_client(client, mix, stop):
+    operations = sorted(mix)
+    cumulative = list(itertools.accumulate(mix[name] for name in operations))
+    client.sign_in()
+    while not stop.is_set():
+        pick = bisect.bisect(cumulative, client.rng.random() * cumulative[-1])
+        getattr(client, operations[pick])()
+
+
+def percentile(ordered, fraction):
+    """
+    Returns the nearest-rank percentile of an ascending list
+    """
+    index = max(0, min(len(ordered) - 1,
+                       int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, errors, duration):
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'rps': round(len(ordered) / duration, 2),
+        'mean_ms': round(1000 * sum(ordered) / len(ordered), 3),
+        'p50_ms': round(1000 * percentile(ordered, 0.50), 3),
+        'p95_ms': round(1000 * percentile(ordered, 0.95), 3),
+        'p99_ms': round(1000 * percentile(ordered, 0.99), 3),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns the regressions of results against baseline, as lines of text
+    """
+    regressions = []
+    for endpoint, summary in sorted(results['endpoints'].items()):
+        before = baseline.get('endpoints', {}).get(endpoint)
+        if before is None:
+            continue
+        for metric, higher_is_better in COMPARED:
+            old, new = before[metric], summary[metric]
+            if not old:
+                continue
+            change = (new - old) / float(old)
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append('{} {}: {} -> {} ({:+.1%})'.format(
+                    endpoint, metric, old, new, change))
+    return regressions
+
+
+def print_table(results):
+    print('{:<14} {:>9} {:>7} {:>9} {:>9} {:>9} {:>9}'.format(
+        'endpoint', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms',
+        'p99 ms'))
+    rows = sorted(results['endpoints'].items())
+    rows.append(('total', results['total']))
+    for endpoint, summary in rows:
+        print('{:<14} {:>9} {:>7} {:>9.1f} {:>9.2f} {:>9.2f} {:>9.2f}'.format(
+            endpoint, summary['requests'], summary['errors'],
+            summary['rps'], summary['p50_ms'], summary['p95_ms'],
+            summary['p99_ms']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--database-url',
+                        help='database to seed and run against (emptied); '
+                             'a temporary SQLite file by default')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--farms', type=int, default=5000)
+    parser.add_argument('--tokens', type=int, default=5,
+                        help='access/refresh token pairs issued per user')
+    parser.add_argument('--clients', type=int, default=16,
+                        help='concurrent keep-alive clients')
+    parser.add_argument('--duration', type=float, default=30,
+                        help='seconds measured')
+    parser.add_argument('--warmup', type=float, default=5,
+                        help='seconds run before measuring')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(None),
+                        help='weighted operations, e.g. '
+                             'list_farms=5,get_farm=3 (default: {})'.format(
+                                 ','.join('{}={}'.format(*item) for item
+                                          in sorted(DEFAULT_MIX.items()))))
+    parser.add_argument('--bcrypt-rounds', type=int,
+                        default=Config.BCRYPT_LOG_ROUNDS)
+    parser.add_argument('--seed', type=int, default=0,
+                        help='random seed of the dataset and the clients')
+    parser.add_argument('--output', help='file to write the results to')
+    parser.add_argument('--baseline',
+                        help='results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='largest relative drop in req/s or rise in p95 '
+                             'latency accepted against the baseline')
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(prefix='catalog-bench-'), 'bench.sqlite')
+    config = type('BenchmarkConfig', (Config,), {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'BCRYPT_LOG_ROUNDS': args.bcrypt_rounds,
+        'PASSWORD_HASH_QUEUE_DEPTH': max(Config.PASSWORD_HASH_QUEUE_DEPTH,
+                                         args.clients),
+    })
+    from app import create_app
+
+    app = create_app(config)
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    emails, farm_ids = seed(app, args.users, args.farms, args.tokens, rng)
+    print('seeded {} users, {} farms and {} tokens in {:.1f}s'.format(
+        args.users, args.farms, 2 * args.tokens * args.users,
+        time.perf_counter() - started))
+
+    server = make_server('127.0.0.1', 0, app, threaded=True,
+                         request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    all_farm_ids = [farm_id for ids in farm_ids for farm_id in ids]
+    recorder = Recorder()
+    stop = threading.Event()
+    clients = []
+    for i in range(args.clients):
+        client = Client(server.server_port, emails[i % len(emails)],
+                        farm_ids[i % len(emails)], all_farm_ids,
+                        random.Random(rng.random()), recorder)
+        thread = threading.Thread(target=run_client,
+                                  args=(client, args.mix, stop))
+        thread.daemon = True
+        thread.start()
+        clients.append(thread)
+
+    time.sleep(args.warmup)
+    recorder.recording = True
+    measured = time.perf_counter()
+    time.sleep(args.duration)
+    recorder.recording = False
+    duration = time.perf_counter() - measured
+    stop.set()
+    for thread in clients:
+        thread.join()
+    server.shutdown()
+
+    all_latencies = [latency for latencies in recorder.latencies.values()
+                     for latency in latencies]
+    if not all_latencies:
+        sys.exit('no requests completed')
+    results = {
+        'created': datetime.utcnow().isoformat() + 'Z',
+        'settings': dict((key, value) for key, value in vars(args).items()
+                         if key not in ('output', 'baseline')),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': database_url.split(':', 1)[0],
+        },
+        'endpoints': dict(
+            (endpoint, summarize(latencies,
+                                 recorder.errors.get(endpoint, 0), duration))
+            for endpoint, latencies in recorder.latencies.items()),
+        'total': summarize(all_latencies, sum(recorder.errors.values()),
+                           duration),
+    }
+    print_table(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print('regression: ' + line)
+        if regressions:
+            sys.exit(1)
+        print('no regressions against {} (tolerance {:.0%})'.format(
+            args.baseline, args.tolerance))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+benchmarks.bcrypt_cost
+~~~~~~~~~~~~~~~~~~~~~~
+
+Measures password hashes per second for a range of bcrypt cost factors,
+both on the calling thread and through the application's hashing pool, to
+help choose BCRYPT_LOG_ROUNDS and PASSWORD_HASH_WORKERS.
+
+    python -m benchmarks.bcrypt_cost --rounds 10 11 12 --workers 2
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from flask_bcrypt import Bcrypt  # noqa: E402
+
+from app.hashing import PasswordHasher  # noqa: E402
+
+PASSWORD = 'c0rrect-horse!'
+
+
+def hashes_per_second(hash_one, count, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        list(clients.map(lambda _: hash_one(), range(count)))
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--rounds', type=int, nargs='+',
+                        default=[10, 11, 12, 13])
+    parser.add_argument('--workers', type=int, default=2,
+                        help='PASSWORD_HASH_WORKERS for the pooled run')
+    parser.add_argument('--clients', type=int, default=8,
+                        help='concurrent callers for the pooled run')
+    parser.add_argument('--count', type=int, default=16,
+                        help='hashes per measurement')
+    args = parser.parse_args()
+
+    print('{:>6} {:>12} {:>12} {:>10}'.format(
+        'rounds', 'inline h/s', 'pooled h/s', 'ms/hash'))
+    for rounds in args.rounds:
+        app = Flask(__name__)
+        app.config.update(BCRYPT_LOG_ROUNDS=rounds,
+                          PASSWORD_HASH_WORKERS=args.workers,
+                          PASSWORD_HASH_QUEUE_DEPTH=args.clients)
+        bcrypt = Bcrypt(app)
+        hasher = PasswordHasher(bcrypt)
+        hasher.init_app(app)
+
+        inline = hashes_per_second(
+            lambda: bcrypt.generate_password_hash(PASSWORD, rounds),
+            args.count, 1)
+        pooled = hashes_per_second(
+            lambda: hasher.generate_password_hash(PASSWORD),
+            args.count, args.clients)
+        print('{:>6} {:>12.1f} {:>12.1f} {:>10.1f}'.format(
+            rounds, inline, pooled, 1000.0 / inline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+benchmarks.request_parsing
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Measures the cost of parsing request payloads per request, with the
+precompiled schemas of app.api.common.schemas and with the
+reqparse.RequestParser setups they replaced (the single field update built
+its parser on every request).
+
+    python -m benchmarks.request_parsing --count 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from flask_restful import reqparse  # noqa: E402
+
+from app.api.common.schemas import Schema  # noqa: E402
+
+FARM_FIELDS = ('name', 'location', 'description', 'units', 'farm_stage',
+               'latitude', 'longitude')
+FARM = {'name': 'Hillside farm', 'location': 'Nakuru',
+        'description': 'maize and beans', 'units': 40,
+        'latitude': -0.3, 'longitude': 36.07}
+
+
+def credentials_parser():
+    parser = reqparse.RequestParser()
+    parser.add_argument('email', type=str)
+    parser.add_argument('password', type=str)
+    return parser
+
+
+def farm_parser():
+    parser = reqparse.RequestParser()
+    for field in FARM_FIELDS:
+        parser.add_argument(field, type=str)
+    return parser
+
+
+def field_parser():
+    parser = reqparse.RequestParser()
+    parser.add_argument('units', type=str, required=True)
+    return parser
+
+
+def revoke_parser():
+    parser = reqparse.RequestParser()
+    parser.add_argument('revoke', type=bool)
+    return parser
+
+
+CREDENTIALS_PARSER = credentials_parser()
+FARM_PARSER = farm_parser()
+
+# name: (JSON body, reqparse setup, schema)
+CASES = [
+    ('credentials', {'email': 'jane@example.com', 'password': 'c0rrect!'},
+     lambda: CREDENTIALS_PARSER.parse_args(),
+     Schema([('email', str), ('password', str)]).parse),
+    ('farm', FARM,
+     lambda: FARM_PARSER.parse_args(),
+     Schema([(field, str) for field in FARM_FIELDS]).parse),
+    ('field', {'units': 12},
+     lambda: field_parser().parse_args(strict=True),
+     Schema([('units', str)], required=['units'], strict=True).parse),
+    ('revoke', {'revoke': True},
+     lambda: revoke_parser().parse_args(),
+     Schema([('revoke', bool)]).parse),
+]
+
+
+def per_request(app, body, parse, count):
+    """
+    Returns the mean time in microseconds parse takes, each time in a new
+    request context
+    """
+    total = 0.0
+    for _ in range(count):
+        with app.test_request_context('/', method='POST', json=body):
+            started = time.perf_counter()
+            parse()
+            total += time.perf_counter() - started
+    return total / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--count', type=int, default=2000,
+                        help='requests parsed per measurement')
+    parser.add_argument('--batch', type=int, default=500,
+                        help='items in the batch payload')
+    args = parser.parse_args()
+    app = Flask(__name__)
+
+    print('{:<12} {:>14} {:>14} {:>9}'.format(
+        'payload', 'reqparse us', 'schema us', 'speedup'))
+    for name, body, reqparse_parse, schema_parse in CASES:
+        before = per_request(app, body, reqparse_parse, args.count)
+        after = per_request(app, body, schema_parse, args.count)
+        print('{:<12} {:>14.2f} {:>14.2f} {:>8.1f}x'.format(
+            name, before, after, before / after))
+
+    # items of a bulk create, read with Schema.load from the decoded body
+    schema = Schema([(field, str) for field in FARM_FIELDS])
+    items = [dict(FARM) for _ in range(args.batch)]
+    rounds = max(1, args.count // args.batch)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for item in items:
+            schema.load(item)
+    elapsed = (time.perf_counter() - started) / (rounds * args.batch) * 1e6
+    print('{:<12} {:>14} {:>14.2f}   per item of {}'.format(
+        'batch', '-', elapsed, args.batch))
+
+
+if __name__ == '__main__':
+    main()
@@ -8,13 +8,90 @@ load_dotenv(os.path.join(basedir, '.env'))
 class Config(object):
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # read replicas (comma-separated DATABASE_REPLICA_URLS). GET requests
+    # read from them, except for the token revocation check; a client that
+    # wrote reads from the primary for REPLICA_STICKY_SECONDS.
+    SQLALCHEMY_REPLICA_URIS = [
+        uri for uri in os.getenv('DATABASE_REPLICA_URLS', '').split(',')
+        if uri]
+    REPLICA_STICKY_SECONDS = 5
+    # engine options (pool_size, max_overflow, pool_pre_ping, pool_recycle,
+    # ...) of the primary and of each replica
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    SQLALCHEMY_REPLICA_ENGINE_OPTIONS = {}
     JWT_SECRET_KEY = os.getenv('SECRET_KEY', 'imasosecret')
     SECRET_KEY = os.getenv('SECRET_KEY')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=120)
     # token revoking
     JWT_BLACKLIST_ENABLED = True
     JWT_BLACKLIST_TOKEN_CHECKS = ['access', 'refresh']
+    # in-process cache of jti -> revoked status. Entries never outlive the
+    # token's exp; a revoke made by another process is seen after at most
+    # REVOCATION_CACHE_TTL seconds.
+    REVOCATION_CACHE_ENABLED = False
+    REVOCATION_CACHE_SIZE = 10000
+    REVOCATION_CACHE_TTL = 30
+    # cross-request cache of user identities (id, email, admin)
+    USER_CACHE_ENABLED = False
+    USER_CACHE_SIZE = 10000
+    USER_CACHE_TTL = 60
+    # 'all' stores every issued token and treats unknown tokens as revoked.
+    # 'revoked' only stores revoked tokens and checks a bloom filter of them
+    # before going to the database.
+    TOKEN_STORE_MODE = 'all'
+    # 'table' keeps tokens in token_blacklist. 'partitioned' keeps them in one
+    # bucket per expiry day (Postgres partitions of token_store), so pruning
+    # drops whole buckets.
+    TOKEN_STORE_LAYOUT = 'table'
+    # write issued tokens from a background queue in batches. A token not
+    # written yet is accepted for TOKEN_WRITE_BEHIND_GRACE seconds after issue.
+    TOKEN_WRITE_BEHIND = False
+    TOKEN_WRITE_BEHIND_BATCH = 100
+    TOKEN_WRITE_BEHIND_DELAY = 0.05
+    TOKEN_WRITE_BEHIND_GRACE = 10
+    TOKEN_BLOOM_CAPACITY = 100000
+    TOKEN_BLOOM_ERROR_RATE = 0.001
+    TOKEN_BLOOM_REFRESH = 30
+    # expired token pruning: rows per DELETE, and seconds between runs of
+    # the background pruner (0 leaves pruning to `flask prune-tokens`)
+    TOKEN_PRUNE_BATCH_SIZE = 1000
+    TOKEN_PRUNE_INTERVAL = 0
     PROPAGATE_EXCEPTIONS = True
+    # password hashing: bcrypt cost, and the bounded pool it runs on. Hash
+    # requests beyond the workers and queue depth are answered with a 503.
+    BCRYPT_LOG_ROUNDS = 12
+    PASSWORD_HASH_WORKERS = 2
+    PASSWORD_HASH_QUEUE_DEPTH = 16
+    # collection pagination; page[size] is capped at MAX_PAGE_SIZE
+    PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 100
+    # most farms accepted by one bulk create request
+    MAX_BULK_SIZE = 500
+    # rows fetched per round trip by the streaming farm export
+    EXPORT_BATCH_SIZE = 500
+    # radius in km of filter[near] farm queries without filter[radius], and
+    # the largest radius allowed
+    GEO_DEFAULT_RADIUS = 10
+    GEO_MAX_RADIUS = 500
+    # threads requests run on under the ASGI entry point (app.asgi). Keep
+    # within the database pool size plus overflow (5 + 10 by default).
+    ASGI_WORKERS = 15
+    # request, SQL, pool and hashing histograms served at /api/metrics.
+    # Processes serving the same application write their totals to files
+    # in METRICS_DIR, at most every METRICS_FLUSH_INTERVAL seconds.
+    METRICS_ENABLED = True
+    METRICS_DIR = os.getenv('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = 10
+    # SQL profiling for development and staging (app.profiling): log every
+    # request's statements, flagging repeats, likely N+1 queries and queries
+    # slower than PROFILE_SLOW_QUERY_MS. With PROFILE_QUERY_BUDGET set, a
+    # request running more statements fails under TESTING.
+    PROFILE_QUERIES = os.getenv('PROFILE_QUERIES') == '1'
+    PROFILE_SLOW_QUERY_MS = 100
+    PROFILE_EXPLAIN = True
+    PROFILE_N_PLUS_ONE_THRESHOLD = 5
+    PROFILE_QUERY_BUDGET = None
+    PROFILE_REPORT_DIR = os.getenv('PROFILE_REPORT_DIR')
 
 class TestConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URL')
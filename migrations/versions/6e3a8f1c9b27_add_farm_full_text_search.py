@@ -0,0 +1,63 @@
+"""Add farm full text search
+
+Revision ID: 6e3a8f1c9b27
+Revises: 9d4c1f7e2b56
+Create Date: 2026-10-18 22:05:41.903127
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '6e3a8f1c9b27'
+down_revision = '9d4c1f7e2b56'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Must match app.search: an expression GIN index on PostgreSQL, an FTS5
+    # table kept current by triggers on SQLite
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute(
+            "CREATE INDEX ix_farms_search ON farms USING gin "
+            "(to_tsvector('english', "
+            "coalesce(name, '') || ' ' || coalesce(description, '')))"
+        )
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE farms_fts USING fts5(name, description, "
+            "content='farms', content_rowid='id', "
+            "tokenize='porter unicode61')"
+        )
+        op.execute(
+            "CREATE TRIGGER farms_fts_insert AFTER INSERT ON farms BEGIN "
+            "INSERT INTO farms_fts (rowid, name, description) "
+            "VALUES (new.id, new.name, new.description); END"
+        )
+        op.execute(
+            "CREATE TRIGGER farms_fts_delete AFTER DELETE ON farms BEGIN "
+            "INSERT INTO farms_fts (farms_fts, rowid, name, description) "
+            "VALUES ('delete', old.id, old.name, old.description); END"
+        )
+        op.execute(
+            "CREATE TRIGGER farms_fts_update AFTER UPDATE OF name, "
+            "description ON farms BEGIN "
+            "INSERT INTO farms_fts (farms_fts, rowid, name, description) "
+            "VALUES ('delete', old.id, old.name, old.description); "
+            "INSERT INTO farms_fts (rowid, name, description) "
+            "VALUES (new.id, new.name, new.description); END"
+        )
+        op.execute("INSERT INTO farms_fts (farms_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('ix_farms_search', table_name='farms')
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER farms_fts_update")
+        op.execute("DROP TRIGGER farms_fts_delete")
+        op.execute("DROP TRIGGER farms_fts_insert")
+        op.execute("DROP TABLE farms_fts")
@@ -0,0 +1,46 @@
+"""Add partitioned token store
+
+Revision ID: e2b7c5a8f031
+Revises: a4f09b6e3d21
+Create Date: 2026-10-18 20:47:53.284410
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b7c5a8f031'
+down_revision = 'a4f09b6e3d21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Parent of the daily token_blacklist_pYYYYMMDD partitions used when
+    # TOKEN_STORE_LAYOUT = 'partitioned'. The partitions themselves are
+    # created by the application as tokens are issued. Other databases use
+    # plain bucket tables created on first use and need nothing here.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.create_table('token_store',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('jti', sa.String(length=50), nullable=False),
+    sa.Column('token_type', sa.String(length=10), nullable=False),
+    sa.Column('user_identity', sa.String(length=50), nullable=False),
+    sa.Column('revoked', sa.Boolean(), nullable=False),
+    sa.Column('expires', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id', 'expires'),
+    postgresql_partition_by='RANGE (expires)'
+    )
+    op.create_index(op.f('ix_token_store_jti'), 'token_store', ['jti'], unique=False)
+    op.create_index(op.f('ix_token_store_user_identity'), 'token_store', ['user_identity'], unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    # Dropping the parent drops every partition with it
+    op.drop_index(op.f('ix_token_store_user_identity'), table_name='token_store')
+    op.drop_index(op.f('ix_token_store_jti'), table_name='token_store')
+    op.drop_table('token_store')
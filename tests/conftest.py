@@ -0,0 +1,84 @@
+"""
+Fixtures for the API tests
+
+Tests run against TEST_DATABASE_URL when it is set (Postgres on CI) and
+against a SQLite file of their own otherwise.
+"""
+import pytest
+
+from app import create_app, db
+from config import TestConfig
+
+PASSWORD = 'Passw0rd!'
+
+
+@pytest.fixture
+def make_app(tmpdir):
+    """
+    Returns a function creating an application whose config is TestConfig
+    with the given settings, with its tables created. No application context
+    is left pushed, so that each test client request gets its own ``g``.
+    """
+    apps = []
+
+    def make(**settings):
+        settings.setdefault(
+            'SQLALCHEMY_DATABASE_URI', TestConfig.SQLALCHEMY_DATABASE_URI or
+            'sqlite:///' + str(tmpdir.join('test.sqlite')))
+        # the lowest cost bcrypt allows, to keep tests fast
+        settings.setdefault('BCRYPT_LOG_ROUNDS', 4)
+        app = create_app(type('Config', (TestConfig,), settings))
+        with app.app_context():
+            db.create_all()
+        apps.append(app)
+        return app
+
+    yield make
+    for app in reversed(apps):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def headers(client):
+    """
+    Authorization headers of a newly registered user
+    """
+    return auth(register(client)['access_token'])
+
+
+def register(client, email='farmer@example.com', password=PASSWORD):
+    """
+    Registers a user and returns the tokens issued
+    """
+    response = client.post('/api/auth/register',
+                           json={'email': email, 'password': password})
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['data'][0]
+
+
+def auth(token):
+    return {'Authorization': 'Bearer ' + token}
+
+
+def create_farm(client, headers, **fields):
+    """
+    Creates a farm and returns its serialized data
+    """
+    farm = {'name': 'Hillside farm', 'description': 'maize and beans',
+            'location': 'Nakuru', 'units': '12'}
+    farm.update(fields)
+    response = client.post('/api/farms', json=farm, headers=headers)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['data'][0]
@@ -0,0 +1,73 @@
+"""
+The API load benchmark
+"""
+import argparse
+import random
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+from benchmarks.api_load import (
+    DEFAULT_MIX, Client, QuietHandler, Recorder, compare, parse_mix,
+    percentile, seed, summarize)
+
+
+def test_percentile_is_nearest_rank():
+    ordered = list(range(1, 101))
+    assert percentile(ordered, 0.5) == 50
+    assert percentile(ordered, 0.95) == 95
+    assert percentile(ordered, 0.99) == 99
+    assert percentile([7], 0.99) == 7
+
+
+def test_summarize():
+    summary = summarize([0.003, 0.001, 0.002, 0.004], errors=1, duration=2)
+    assert summary == {'requests': 4, 'errors': 1, 'rps': 2.0,
+                       'mean_ms': 2.5, 'p50_ms': 2.0, 'p95_ms': 4.0,
+                       'p99_ms': 4.0}
+
+
+def test_parse_mix():
+    assert parse_mix(None) == DEFAULT_MIX
+    assert parse_mix('list_farms=3,get_farm') == {'list_farms': 3.0,
+                                                   'get_farm': 1.0}
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_mix('delete_everything=1')
+
+
+def test_compare_reports_regressions_beyond_the_tolerance():
+    baseline = {'endpoints': {'get_farm': {'rps': 100, 'p95_ms': 10},
+                              'list_farms': {'rps': 50, 'p95_ms': 20}}}
+    results = {'endpoints': {'get_farm': {'rps': 95, 'p95_ms': 10.5},
+                             'list_farms': {'rps': 40, 'p95_ms': 25},
+                             'sign_in': {'rps': 1, 'p95_ms': 500}}}
+    assert compare(results, baseline, tolerance=0.1) == [
+        'list_farms rps: 50 -> 40 (-20.0%)',
+        'list_farms p95_ms: 20 -> 25 (+25.0%)']
+
+
+def test_every_operation_succeeds_against_a_seeded_app(app):
+    rng = random.Random(0)
+    emails, farm_ids = seed(app, users=2, farms=10, tokens=1, rng=rng)
+    assert len(emails) == 2 and sum(len(ids) for ids in farm_ids) == 10
+
+    server = make_server('127.0.0.1', 0, app, threaded=True,
+                         request_handler=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        recorder = Recorder()
+        recorder.recording = True
+        client = Client(server.server_port, emails[0], farm_ids[0],
+                        farm_ids[0] + farm_ids[1], rng, recorder)
+        client.sign_in()
+        for operation in sorted(DEFAULT_MIX):
+            getattr(client, operation)()
+        client.connection.close()
+    finally:
+        server.shutdown()
+        thread.join()
+    assert recorder.errors == {}
+    assert set(recorder.latencies) == set(DEFAULT_MIX) - {
+        'create_delete_farm'} | {'create_farm', 'delete_farm'}
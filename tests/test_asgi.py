@@ -0,0 +1,59 @@
+"""
+The ASGI entry point
+"""
+import asyncio
+
+from app.asgi import ASGIApp
+
+
+def echo_headers(environ, start_response):
+    body = '\n'.join('{}={}'.format(key, environ.get(key, '')) for key in
+                     ('HTTP_COOKIE', 'HTTP_ACCEPT', 'HTTP_X_SINGLE'))
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [body.encode('latin-1')]
+
+
+def run(app, scope, messages):
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(app(scope, receive, send))
+    finally:
+        loop.close()
+    return sent
+
+
+def http_scope(headers):
+    return {'type': 'http', 'method': 'GET', 'path': '/', 'headers': headers,
+            'query_string': b'', 'http_version': '1.1'}
+
+
+def test_repeated_headers_are_folded():
+    app = ASGIApp(echo_headers, workers=1)
+    sent = run(app, http_scope([
+        (b'cookie', b'a=1'), (b'cookie', b'b=2'),
+        (b'accept', b'text/html'), (b'accept', b'application/json'),
+        (b'x-single', b'one'),
+    ]), [{'type': 'http.request', 'body': b''}])
+    assert sent[0]['status'] == 200
+    body = b''.join(message.get('body', b'') for message in sent[1:])
+    assert body.decode('latin-1').split('\n') == [
+        'HTTP_COOKIE=a=1; b=2',
+        'HTTP_ACCEPT=text/html,application/json',
+        'HTTP_X_SINGLE=one',
+    ]
+
+
+def test_lifespan_shutdown_completes():
+    app = ASGIApp(echo_headers, workers=1)
+    sent = run(app, {'type': 'lifespan'}, [
+        {'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+    assert [message['type'] for message in sent] == [
+        'lifespan.startup.complete', 'lifespan.shutdown.complete']
@@ -0,0 +1,52 @@
+"""
+ETags and conditional GETs of farms
+"""
+from tests.conftest import create_farm
+
+
+def revalidate(client, headers, path, etag):
+    return client.get(path, headers=dict(headers, **{'If-None-Match': etag}))
+
+
+def test_farm_is_not_modified_until_updated(client, headers):
+    path = '/api/farms/{}'.format(create_farm(client, headers)['id'])
+    etag = client.get(path, headers=headers).headers['ETag']
+
+    response = revalidate(client, headers, path, etag)
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+
+    client.patch(path, headers=headers, json={'units': 30})
+    response = revalidate(client, headers, path, etag)
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()['data'][0]['units'] == 30
+
+
+def test_collection_is_not_modified_until_a_farm_changes(client, headers):
+    create_farm(client, headers)
+    etag = client.get('/api/farms', headers=headers).headers['ETag']
+    assert revalidate(client, headers, '/api/farms', etag).status_code == 304
+
+    create_farm(client, headers, name='Valley farm')
+    response = revalidate(client, headers, '/api/farms', etag)
+    assert response.status_code == 200
+    assert len(response.get_json()['data']) == 2
+
+
+def test_deleting_a_farm_changes_the_collection(client, headers):
+    farm = create_farm(client, headers)
+    etag = client.get('/api/farms', headers=headers).headers['ETag']
+    client.delete('/api/farms/{}'.format(farm['id']), headers=headers)
+    assert revalidate(client, headers, '/api/farms', etag).status_code == 200
+
+
+def test_query_string_selects_the_representation(client, headers):
+    create_farm(client, headers)
+    full = client.get('/api/farms', headers=headers).headers['ETag']
+    sparse = client.get('/api/farms?fields[farms]=name',
+                        headers=headers).headers['ETag']
+    assert full != sparse
+    response = revalidate(client, headers, '/api/farms?fields[farms]=name',
+                          full)
+    assert response.status_code == 200
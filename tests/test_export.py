@@ -0,0 +1,46 @@
+"""
+The streaming farm export
+"""
+import json
+
+from tests.conftest import auth, create_farm, register
+
+
+def test_ndjson_export_streams_every_farm(make_app):
+    app = make_app(EXPORT_BATCH_SIZE=2)
+    client = app.test_client()
+    headers = auth(register(client)['access_token'])
+    created = [create_farm(client, headers, name='Farm {}'.format(i))
+               for i in range(5)]
+
+    response = client.get('/api/farms/export', headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data().splitlines()
+    farms = [json.loads(line.decode('utf-8')) for line in lines]
+    assert [farm['id'] for farm in farms] == [farm['id'] for farm in created]
+    assert farms[0]['name'] == 'Farm 0'
+    assert farms[0]['createdby'] == created[0]['createdby']
+
+
+def test_json_export_is_one_array(make_app):
+    app = make_app(EXPORT_BATCH_SIZE=2)
+    client = app.test_client()
+    headers = auth(register(client)['access_token'])
+    for i in range(3):
+        create_farm(client, headers, name='Farm {}'.format(i))
+
+    response = client.get('/api/farms/export?format=json', headers=headers)
+    assert response.mimetype == 'application/json'
+    farms = json.loads(response.get_data().decode('utf-8'))
+    assert [farm['name'] for farm in farms] == ['Farm 0', 'Farm 1', 'Farm 2']
+
+
+def test_json_export_of_no_farms(client, headers):
+    response = client.get('/api/farms/export?format=json', headers=headers)
+    assert response.get_data() == b'[]'
+
+
+def test_unknown_export_format(client, headers):
+    response = client.get('/api/farms/export?format=csv', headers=headers)
+    assert response.status_code == 400
@@ -0,0 +1,69 @@
+"""
+The incrementally maintained farm statistics
+"""
+from sqlalchemy import event
+
+from app import db
+from app.stats import count_farms, rebuild_farm_stats
+from tests.conftest import create_farm
+
+
+def stats(client, headers):
+    response = client.get('/api/farms/stats', headers=headers)
+    assert response.status_code == 200
+    return response.get_json()['data']
+
+
+def test_statistics_follow_farm_writes(app, client, headers):
+    first = create_farm(client, headers, units='10')
+    create_farm(client, headers, units='5')
+    create_farm(client, headers, location='Kisumu', units='7')
+    client.patch('/api/farms/{}'.format(first['id']), headers=headers,
+                 json={'stage': 'open', 'margin': 20})
+    client.post('/api/farms/bulk', headers=headers, json={'data': [
+        {'type': 'farms', 'attributes': {
+            'name': 'Bulk farm', 'description': 'tea', 'location': 'Kisumu',
+            'units': '3'}}]})
+    client.patch('/api/farms/{}/margin'.format(first['id']),
+                 headers=headers, json={'margin': '30'})
+    assert stats(client, headers) == [
+        {'location': 'Kisumu', 'stage': 'closed', 'active': False,
+         'farms': 2, 'units': 10, 'average_margin': None},
+        {'location': 'Nakuru', 'stage': 'closed', 'active': False,
+         'farms': 1, 'units': 5, 'average_margin': None},
+        {'location': 'Nakuru', 'stage': 'open', 'active': False,
+         'farms': 1, 'units': 10, 'average_margin': 30.0},
+    ]
+
+    client.delete('/api/farms/{}'.format(first['id']), headers=headers)
+    maintained = stats(client, headers)
+    assert [row['stage'] for row in maintained] == ['closed', 'closed']
+    with app.app_context():
+        assert rebuild_farm_stats() == 2
+    assert stats(client, headers) == maintained
+
+
+def test_groups_are_written_in_a_fixed_order(app):
+    closed = {'location': 'Nakuru', 'stage': 'closed', 'active': False}
+    opened = {'location': 'Nakuru', 'stage': 'open', 'active': False}
+    unknown = {'location': None, 'stage': 'open', 'active': None}
+    orders = []
+    with app.app_context():
+        for added, removed in (([closed, unknown], [opened]),
+                               ([opened], [unknown, closed])):
+            groups = []
+
+            def record(conn, cursor, statement, parameters, *args):
+                if statement.startswith('UPDATE farm_stats'):
+                    # the new values come first, then the group
+                    groups.append(tuple(parameters[4:]))
+
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                count_farms(added=added, removed=removed)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+            db.session.rollback()
+            orders.append(groups)
+    assert orders[0] == orders[1]
+    assert len(orders[0]) == 3
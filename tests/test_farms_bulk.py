@@ -0,0 +1,110 @@
+"""
+Bulk farm creation with a mix of farms with and without coordinates
+"""
+from sqlalchemy.dialects import postgresql
+
+from app.api.farms import (
+    BULK_DEFAULTS, BULK_MATCH_COLUMNS, assign_returned_ids, new_farm_values
+)
+from app.models import Farm
+
+WITH_COORDINATES = {'name': 'Hillside', 'description': 'maize',
+                    'location': 'Nakuru', 'units': '12',
+                    'latitude': '-0.3', 'longitude': '36.07'}
+WITHOUT_COORDINATES = {'name': 'Riverside', 'description': 'beans',
+                       'location': 'Kisumu', 'units': '4'}
+
+
+def bulk_rows(*payloads):
+    rows = []
+    for args in payloads:
+        values, error = new_farm_values(args)
+        assert error is None
+        rows.append(values)
+    return rows
+
+
+def compiled_insert(rows):
+    table = Farm.__table__
+    statement = table.insert().values(rows).returning(table.c.id)
+    return statement.compile(dialect=postgresql.dialect())
+
+
+def test_rows_share_keys():
+    rows = bulk_rows(WITHOUT_COORDINATES, WITH_COORDINATES)
+    assert set(rows[0]) == set(rows[1])
+    assert rows[0]['latitude'] is None and rows[0]['geohash'] is None
+
+
+def test_multi_row_insert_keeps_coordinates_of_later_rows():
+    params = compiled_insert(
+        bulk_rows(WITHOUT_COORDINATES, WITH_COORDINATES)).params
+    assert params['latitude_m1'] == -0.3
+    assert params['longitude_m1'] == 36.07
+    assert params['geohash_m1']
+    assert params['latitude_m0'] is None
+
+
+def test_multi_row_insert_compiles_with_coordinates_first():
+    params = compiled_insert(
+        bulk_rows(WITH_COORDINATES, WITHOUT_COORDINATES)).params
+    assert params['latitude_m0'] == -0.3
+    assert params['latitude_m1'] is None
+
+
+def returned(row, farm_id):
+    return (farm_id,) + tuple(row[name] for name in BULK_MATCH_COLUMNS)
+
+
+def test_returned_ids_are_matched_by_values():
+    rows = bulk_rows(WITHOUT_COORDINATES, WITH_COORDINATES)
+    assign_returned_ids(rows, [returned(rows[1], 8), returned(rows[0], 7)])
+    assert [row['id'] for row in rows] == [7, 8]
+
+
+def test_identical_rows_get_distinct_ids():
+    rows = bulk_rows(WITH_COORDINATES, WITHOUT_COORDINATES, WITH_COORDINATES)
+    assign_returned_ids(rows, [returned(rows[1], 5), returned(rows[0], 4),
+                               returned(rows[2], 6)])
+    assert rows[1]['id'] == 5
+    assert sorted([rows[0]['id'], rows[2]['id']]) == [4, 6]
+
+
+def test_bulk_defaults_are_the_column_defaults():
+    farm = Farm.__table__
+    for name, value in BULK_DEFAULTS.items():
+        assert farm.c[name].default.arg == value
+    assert BULK_DEFAULTS['stage'] == 'closed'
+    assert BULK_DEFAULTS['active'] is False
+
+
+def resources(*payloads):
+    return {'data': [{'type': 'farms', 'attributes': payload}
+                     for payload in payloads]}
+
+
+def test_bulk_create(client, headers):
+    response = client.post(
+        '/api/farms/bulk', headers=headers,
+        json=resources(WITHOUT_COORDINATES, WITH_COORDINATES))
+    assert response.status_code == 201
+    created = response.get_json()['data']
+    assert [farm['name'] for farm in created] == ['Riverside', 'Hillside']
+    assert created[1]['latitude'] == -0.3
+    assert created[0]['stage'] == 'closed'
+
+    for farm in created:
+        response = client.get('/api/farms/{}'.format(farm['id']),
+                              headers=headers)
+        assert response.get_json()['data'][0]['name'] == farm['name']
+
+
+def test_bulk_create_is_all_or_nothing(client, headers):
+    invalid = dict(WITH_COORDINATES, units='many')
+    response = client.post(
+        '/api/farms/bulk', headers=headers,
+        json=resources(WITHOUT_COORDINATES, invalid))
+    assert response.status_code == 400
+    assert [error['index'] for error in response.get_json()['errors']] == [1]
+    farms = client.get('/api/farms', headers=headers).get_json()['data']
+    assert farms == []
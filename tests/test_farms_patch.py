@@ -0,0 +1,72 @@
+"""
+Updating farms with PATCH, several fields at once or one at a time
+"""
+from sqlalchemy import event
+
+from app import db
+from tests.conftest import auth, create_farm, register
+
+
+def farm_data(client, headers, farm_id):
+    response = client.get('/api/farms/{}'.format(farm_id), headers=headers)
+    return response.get_json()['data'][0]
+
+
+def test_several_fields_in_one_update(app, client, headers):
+    farm = create_farm(client, headers)
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.patch(
+            '/api/farms/{}'.format(farm['id']), headers=headers,
+            json={'name': 'Valley farm', 'stage': 'open', 'units': 20,
+                  'harvest_time': '2027-3-1'})
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code == 200, response.get_json()
+    data = response.get_json()['data'][0]
+    assert data['harvest_time'] == 'Mon, 01 Mar 2027'
+    farm_updates = [statement for statement in statements
+                    if statement.startswith('UPDATE farms ')]
+    assert len(farm_updates) == 1
+
+    farm = farm_data(client, headers, farm['id'])
+    assert (farm['name'], farm['stage'], farm['units']) == \
+        ('Valley farm', 'open', 20)
+
+
+def test_invalid_field_updates_nothing(client, headers):
+    farm = create_farm(client, headers)
+    for body in ({'name': 'Valley farm', 'stage': 'sold'},
+                 {'name': 'Valley farm', 'colour': 'green'},
+                 {'latitude': 1.5},
+                 {}):
+        response = client.patch('/api/farms/{}'.format(farm['id']),
+                                headers=headers, json=body)
+        assert response.status_code == 400
+    assert farm_data(client, headers, farm['id'])['name'] == farm['name']
+
+
+def test_only_the_owner_updates(client, headers):
+    farm = create_farm(client, headers)
+    other = auth(register(client, 'grower@example.com')['access_token'])
+    response = client.patch('/api/farms/{}'.format(farm['id']),
+                            headers=other, json={'name': 'Valley farm'})
+    assert response.status_code == 403
+    response = client.patch('/api/farms/999', headers=headers,
+                            json={'name': 'Valley farm'})
+    assert response.status_code == 404
+
+
+def test_single_field(client, headers):
+    farm = create_farm(client, headers)
+    response = client.patch('/api/farms/{}/units'.format(farm['id']),
+                            headers=headers, json={'units': '30'})
+    assert response.status_code == 200
+    assert farm_data(client, headers, farm['id'])['units'] == 30
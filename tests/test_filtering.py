@@ -0,0 +1,70 @@
+"""
+Filtering and sorting the farm collection
+"""
+import pytest
+
+from app import db
+from app.models import Farm
+from tests.conftest import auth, create_farm, register
+
+
+@pytest.fixture
+def farms(app, client):
+    """
+    Farms of two owners, returning the headers of the first
+    """
+    headers = auth(register(client)['access_token'])
+    other = auth(register(client, 'grower@example.com')['access_token'])
+    create_farm(client, headers, name='Beta', location='Nakuru')
+    create_farm(client, headers, name='Alpha', location='Kisumu')
+    create_farm(client, other, name='Gamma', location='Nakuru')
+    with app.app_context():
+        farm = Farm.query.filter_by(name='Gamma').one()
+        farm.stage, farm.active = 'open', True
+        db.session.commit()
+    return headers
+
+
+def names(client, headers, query):
+    response = client.get('/api/farms?' + query, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return [farm['name'] for farm in response.get_json()['data']]
+
+
+def test_filters(client, farms):
+    assert sorted(names(client, farms, 'filter[location]=Nakuru')) == \
+        ['Beta', 'Gamma']
+    assert names(client, farms, 'filter[stage]=open') == ['Gamma']
+    assert names(client, farms, 'filter[active]=true') == ['Gamma']
+    assert sorted(names(client, farms, 'filter[active]=false')) == \
+        ['Alpha', 'Beta']
+    assert names(client, farms,
+                 'filter[location]=Nakuru&filter[active]=false') == ['Beta']
+
+
+def test_filter_by_owner(client, farms):
+    owner = client.get('/api/farms?filter[stage]=open',
+                       headers=farms).get_json()['data'][0]['createdby']
+    assert names(client, farms, 'filter[owner]={}'.format(owner)) == \
+        ['Gamma']
+
+
+def test_sort(client, farms):
+    assert names(client, farms, 'sort=name') == ['Alpha', 'Beta', 'Gamma']
+    assert names(client, farms, 'sort=-name') == ['Gamma', 'Beta', 'Alpha']
+    # oldest first by default
+    assert names(client, farms, '') == ['Beta', 'Alpha', 'Gamma']
+    assert names(client, farms, 'sort=-createdon') == \
+        ['Gamma', 'Alpha', 'Beta']
+
+
+@pytest.mark.parametrize('query', [
+    'filter[units]=12',
+    'filter[active]=yes',
+    'filter[owner]=me',
+    'sort=units',
+    'sort=name,createdon',
+])
+def test_unsupported_parameters(client, farms, query):
+    response = client.get('/api/farms?' + query, headers=farms)
+    assert response.status_code == 400
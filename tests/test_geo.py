@@ -0,0 +1,76 @@
+"""
+Nearest farm queries over geohash cells
+"""
+import pytest
+
+from app.geo import covering_cells, encode
+from tests.conftest import create_farm
+
+# Nakuru town, and points about 5km, 30km and 150km from it
+NAKURU = (-0.3031, 36.0800)
+FARMS = [('Lanet', -0.2750, 36.1180), ('Njoro', -0.3300, 35.9400),
+         ('Naivasha', -0.7167, 36.4333)]
+
+
+def test_encode():
+    # the reference value of the geohash algorithm
+    assert encode(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+    assert encode(*NAKURU).startswith(encode(-0.2750, 36.1180, 4))
+
+
+def test_covering_cells_contain_the_points_in_the_radius():
+    cells = covering_cells(NAKURU[0], NAKURU[1], 10)
+    lanet = encode(-0.2750, 36.1180)
+    assert any(lanet.startswith(cell) for cell in cells)
+
+
+@pytest.fixture
+def farms(client, headers):
+    for name, latitude, longitude in FARMS:
+        create_farm(client, headers, name=name, latitude=str(latitude),
+                    longitude=str(longitude))
+    create_farm(client, headers, name='Unmapped')
+    return headers
+
+
+def near(client, headers, query):
+    response = client.get('/api/farms?filter[near]={},{}&{}'.format(
+        NAKURU[0], NAKURU[1], query), headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return [farm['name'] for farm in response.get_json()['data']]
+
+
+def test_farms_within_the_radius_nearest_first(client, farms):
+    assert near(client, farms, '') == ['Lanet']
+    assert near(client, farms, 'filter[radius]=50') == ['Lanet', 'Njoro']
+    assert near(client, farms, 'filter[radius]=200') == \
+        ['Lanet', 'Njoro', 'Naivasha']
+    assert near(client, farms, 'filter[radius]=200&page[size]=1') == \
+        ['Lanet']
+
+
+@pytest.mark.parametrize('query', [
+    'filter[near]=95,36',
+    'filter[near]=-0.3',
+    'filter[near]=-0.3,36&filter[radius]=0',
+    'filter[near]=-0.3,36&filter[radius]=10000',
+    'filter[radius]=10',
+])
+def test_invalid_points(client, headers, query):
+    response = client.get('/api/farms?' + query, headers=headers)
+    assert response.status_code == 400
+
+
+def test_one_coordinate_alone(client, headers):
+    farm = create_farm(client, headers)
+    path = '/api/farms/{}'.format(farm['id'])
+    response = client.patch(path + '/latitude', headers=headers,
+                            json={'latitude': '-0.3'})
+    assert response.status_code == 400
+
+    client.patch(path, headers=headers,
+                 json={'latitude': -0.3, 'longitude': 36.1})
+    response = client.patch(path + '/latitude', headers=headers,
+                            json={'latitude': '-0.28'})
+    assert response.status_code == 200
+    assert near(client, headers, '') == [farm['name']]
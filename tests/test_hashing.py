@@ -0,0 +1,96 @@
+"""
+Password hashing on the bounded worker pool
+"""
+import threading
+
+import pytest
+from flask import Flask
+from flask_bcrypt import Bcrypt
+
+from app.exceptions import HashingBusy
+from app.hashing import PasswordHasher
+
+
+class BlockingBcrypt(object):
+    """
+    Stands in for Flask-Bcrypt, holding every hash until released
+    """
+
+    def __init__(self):
+        self.started = threading.Semaphore(0)
+        self.release = threading.Event()
+
+    def generate_password_hash(self, password, rounds):
+        self.started.release()
+        self.release.wait(5)
+        return b'hash'
+
+
+def config_app(workers=1, queue_depth=0, rounds=4):
+    app = Flask(__name__)
+    app.config.update(PASSWORD_HASH_WORKERS=workers,
+                      PASSWORD_HASH_QUEUE_DEPTH=queue_depth,
+                      BCRYPT_LOG_ROUNDS=rounds)
+    return app
+
+
+def hash_in_background(hasher):
+    thread = threading.Thread(target=hasher.generate_password_hash,
+                              args=('secret',))
+    thread.start()
+    return thread
+
+
+def test_hash_and_check():
+    app = config_app()
+    hasher = PasswordHasher(Bcrypt(app))
+    hasher.init_app(app)
+    pw_hash = hasher.generate_password_hash('s3cret!')
+    assert pw_hash.startswith('$2b$04$')
+    assert hasher.check_password_hash(pw_hash, 's3cret!')
+    assert not hasher.check_password_hash(pw_hash, 'wrong')
+    assert not hasher.needs_rehash(pw_hash)
+    hasher.log_rounds = 5
+    assert hasher.needs_rehash(pw_hash)
+
+
+def test_busy_past_workers_and_queue():
+    bcrypt = BlockingBcrypt()
+    hasher = PasswordHasher(bcrypt)
+    hasher.init_app(config_app(workers=1, queue_depth=1))
+    running = hash_in_background(hasher)
+    queued = hash_in_background(hasher)
+    assert bcrypt.started.acquire(timeout=5)
+    try:
+        with pytest.raises(HashingBusy):
+            hasher.generate_password_hash('secret')
+    finally:
+        bcrypt.release.set()
+        running.join()
+        queued.join()
+    assert hasher.generate_password_hash('secret') == 'hash'
+
+
+def test_reconfiguring_keeps_the_new_cap():
+    old = BlockingBcrypt()
+    hasher = PasswordHasher(old)
+    hasher.init_app(config_app())
+    old_hash = hash_in_background(hasher)
+    assert old.started.acquire(timeout=5)
+    old_pool = hasher._executor
+
+    new = BlockingBcrypt()
+    hasher._bcrypt = new
+    hasher.init_app(config_app())
+    new_hash = hash_in_background(hasher)
+    assert new.started.acquire(timeout=5)
+    try:
+        # the old hash finishing frees a slot of the old pool only
+        old.release.set()
+        old_hash.join()
+        old_pool.shutdown(wait=True)
+        with pytest.raises(HashingBusy):
+            hasher.generate_password_hash('secret')
+    finally:
+        new.release.set()
+        new_hash.join()
@@ -0,0 +1,58 @@
+"""
+Compound farm documents including the farms' owners
+"""
+from sqlalchemy import event
+
+from app import db
+from tests.conftest import auth, create_farm, register
+
+
+def test_owners_are_included_once(app, client, headers):
+    other = auth(register(client, 'grower@example.com')['access_token'])
+    for i in range(3):
+        create_farm(client, headers, name='Farm {}'.format(i))
+    create_farm(client, other, name='Other farm')
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if statement.startswith('SELECT') and 'FROM users' in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.get('/api/farms?include=owner', headers=headers)
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', record)
+    document = response.get_json()
+    owners = dict((user['id'], user['email'])
+                  for user in document['included'])
+    assert sorted(owners.values()) == \
+        ['farmer@example.com', 'grower@example.com']
+    for farm in document['data']:
+        expected = 'grower@example.com' if farm['name'] == 'Other farm' \
+            else 'farmer@example.com'
+        assert owners[farm['createdby']] == expected
+    # one for the current user, one for all the owners
+    assert len(statements) == 2
+
+
+def test_sparse_fieldset_keeps_the_owner_key(client, headers):
+    farm = create_farm(client, headers)
+    response = client.get('/api/farms?fields[farms]=name&include=owner',
+                          headers=headers)
+    document = response.get_json()
+    assert document['data'] == [{'id': farm['id'], 'name': farm['name'],
+                                 'createdby': farm['createdby']}]
+    assert [user['id'] for user in document['included']] == \
+        [farm['createdby']]
+
+    response = client.get('/api/farms/{}?fields[farms]=name&include=owner'
+                          .format(farm['id']), headers=headers)
+    assert response.get_json()['data'][0]['createdby'] == farm['createdby']
+
+
+def test_unsupported_include(client, headers):
+    response = client.get('/api/farms?include=farms', headers=headers)
+    assert response.status_code == 400
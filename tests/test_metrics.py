@@ -0,0 +1,63 @@
+"""
+Request, database and cache metrics
+"""
+import time
+
+import pytest
+from flask import g
+from sqlalchemy.exc import DBAPIError
+
+from app import db
+from app.metrics import Registry, render
+from app.models import User
+from tests.conftest import auth, register
+
+
+def test_histograms_are_rendered_cumulatively():
+    registry = Registry()
+    registry.enabled = True
+    labels = (('endpoint', 'farms'),)
+    for value in (0.003, 0.02, 0.02, 30):
+        registry.observe('http_request_duration_seconds', value, labels)
+    text = render(registry.local_totals())
+    assert 'http_request_duration_seconds_bucket{endpoint="farms",le="0.005"} 1' in text
+    assert 'http_request_duration_seconds_bucket{endpoint="farms",le="0.025"} 3' in text
+    assert 'http_request_duration_seconds_bucket{endpoint="farms",le="10"} 3' in text
+    assert 'http_request_duration_seconds_bucket{endpoint="farms",le="+Inf"} 4' in text
+    assert 'http_request_duration_seconds_count{endpoint="farms"} 4' in text
+
+
+def test_disabled_registry_records_nothing():
+    registry = Registry()
+    registry.observe('http_request_duration_seconds', 1.0)
+    assert registry.local_totals() == {}
+
+
+def test_metrics_are_served_to_admins(client):
+    headers = auth(register(client)['access_token'])
+    assert client.get('/api/metrics', headers=headers).status_code == 403
+    with client.application.app_context():
+        User.query.one().admin = True
+        db.session.commit()
+    client.get('/api/farms', headers=headers)
+
+    response = client.get('/api/metrics', headers=headers)
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    text = response.get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{endpoint="one-acre.farm",' \
+        'method="GET",status="200"}' in text
+    assert 'db_queries_per_request_count{endpoint="one-acre.farm"}' in text
+    assert 'cache_hits_total{cache="revocation"}' in text
+
+
+def test_failed_statements_leave_no_start_time(app):
+    with app.test_request_context():
+        g.metrics_queries = [0, 0.0]
+        with pytest.raises(DBAPIError):
+            db.session.execute('SELECT * FROM no_such_table')
+        db.session.rollback()
+        time.sleep(0.2)
+        db.session.execute('SELECT 1')
+        assert g.metrics_queries[0] == 1
+        assert g.metrics_queries[1] < 0.2
@@ -0,0 +1,65 @@
+"""
+Keyset pagination of the farm collection, and page cursors whose values do
+not match the types of the sort columns
+"""
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import pytest
+
+from app.api.common.pagination import decode_cursor, encode_cursor
+from app.exceptions import InvalidQueryParameter
+from app.models import Farm
+from tests.conftest import create_farm
+
+KEYS = [(Farm.createdon, True), (Farm.name, False), (Farm.id, True)]
+
+
+def test_cursor_round_trip():
+    values = [datetime(2026, 10, 18, 9, 30, 0, 125), 'Hillside', 7]
+    assert decode_cursor(encode_cursor(values), KEYS) == values
+
+
+@pytest.mark.parametrize('values', [
+    ['2026-10-18T09:30:00.000125', 'Hillside', '7'],
+    ['2026-10-18T09:30:00.000125', 'Hillside', True],
+    ['2026-10-18T09:30:00.000125', {'name': 1}, 7],
+    ['2026-10-18T09:30:00.000125', None, 7],
+    [1760779800, 'Hillside', 7],
+])
+def test_mistyped_cursor_is_invalid(values):
+    with pytest.raises(InvalidQueryParameter):
+        decode_cursor(encode_cursor(values), KEYS)
+
+
+def walk(client, headers, url, link):
+    """
+    Follows the given link from url to the end, returning the farm names of
+    every page and the path of the last one
+    """
+    pages = []
+    while True:
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        pages.append([farm['name'] for farm in body['data']])
+        if not body['links'][link]:
+            return pages, url
+        url = '{0.path}?{0.query}'.format(urlsplit(body['links'][link]))
+
+
+def test_pages_cover_the_collection_once(client, headers):
+    # repeated names are ordered by id
+    for name in ('Bravo', 'Alpha', 'Bravo', 'Charlie', 'Alpha'):
+        create_farm(client, headers, name=name)
+    pages, last = walk(client, headers, '/api/farms?sort=name&page[size]=2',
+                       'next')
+    assert pages == [['Alpha', 'Alpha'], ['Bravo', 'Bravo'], ['Charlie']]
+    pages, _ = walk(client, headers, last, 'prev')
+    assert pages == [['Charlie'], ['Bravo', 'Bravo'], ['Alpha', 'Alpha']]
+
+
+def test_after_and_before_together_are_invalid(client, headers):
+    response = client.get('/api/farms?page[after]=a&page[before]=b',
+                          headers=headers)
+    assert response.status_code == 400
@@ -0,0 +1,82 @@
+"""
+The time-partitioned token store layout
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db, partitions
+from app.helpers import prune_database
+from tests.conftest import auth, register
+
+# the parent of the buckets on Postgres, created by the migrations
+TOKEN_STORE = """
+CREATE TABLE token_store (
+    id SERIAL NOT NULL,
+    jti VARCHAR(50) NOT NULL,
+    token_type VARCHAR(10) NOT NULL,
+    user_identity VARCHAR(50) NOT NULL,
+    revoked BOOLEAN NOT NULL,
+    expires TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    PRIMARY KEY (id, expires)
+) PARTITION BY RANGE (expires)
+"""
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app(TOKEN_STORE_LAYOUT='partitioned')
+    with app.app_context():
+        postgres = db.engine.dialect.name == 'postgresql'
+        if postgres:
+            db.engine.execute(TOKEN_STORE)
+        # forget the buckets of other tests' databases
+        partitions._load_buckets()
+    yield app
+    with app.app_context():
+        if postgres:
+            db.engine.execute('DROP TABLE token_store')
+        else:
+            for bucket in partitions._load_buckets():
+                partitions._bucket_table(bucket).drop(db.engine)
+
+
+def test_tokens_are_stored_in_expiry_buckets(client):
+    tokens = register(client)
+    headers = auth(tokens['access_token'])
+    stored = client.get('/api/auth/tokens', headers=headers).get_json()['data']
+    assert sorted(token['token_type'] for token in stored) == \
+        ['access', 'refresh']
+    for token in stored:
+        expires = datetime.strptime(token['expires'], '%a, %d %b %Y %H:%M %p')
+        assert token['token_id'].startswith(
+            expires.strftime(partitions.BUCKET_FORMAT) + '-')
+
+
+def test_revoking_by_bucket_id(client):
+    headers = auth(register(client)['access_token'])
+    stored = client.get('/api/auth/tokens', headers=headers).get_json()['data']
+    access = [token for token in stored if token['token_type'] == 'access'][0]
+
+    response = client.put('/api/auth/tokens/20200101-1',
+                          headers=headers, json={'revoke': True})
+    assert response.status_code == 404
+    response = client.put('/api/auth/tokens/' + access['token_id'],
+                          headers=headers, json={'revoke': True})
+    assert response.status_code == 200
+    assert client.get('/api/farms', headers=headers).status_code == 401
+
+
+def test_pruning_drops_expired_buckets(app):
+    with app.app_context():
+        today = datetime.now()
+        for days in (-3, -2, 1):
+            partitions.add_token('jti{}'.format(days), 'access', 'farmer',
+                                 today + timedelta(days=days))
+            db.session.commit()
+        assert len(partitions._load_buckets()) == 3
+
+        assert prune_database() == 2
+        assert partitions._load_buckets() == [
+            (today + timedelta(days=1)).strftime(partitions.BUCKET_FORMAT)]
+        assert partitions.find_token('jti1', today + timedelta(days=1))
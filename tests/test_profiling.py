@@ -0,0 +1,66 @@
+"""
+Per-request SQL profiling
+"""
+import json
+
+import pytest
+
+from app import db
+from app.exceptions import QueryBudgetExceeded
+from app.profiling import _explain, build_report
+from tests.conftest import auth, create_farm, register
+
+
+def query(statement, parameters='()', slow=False):
+    return {'statement': statement, 'parameters': parameters,
+            'duration_ms': 1.5, 'location': None, 'slow': slow}
+
+
+def test_report_flags_repeated_and_n_plus_one_statements():
+    owner = 'SELECT * FROM users WHERE id = ?'
+    queries = [query('SELECT * FROM farms', slow=True)]
+    queries += [query(owner, '({},)'.format(i)) for i in (1, 2, 3, 1)]
+    report = build_report(queries, n_plus_one_threshold=4)
+    assert report['query_count'] == 5
+    assert report['query_time_ms'] == 7.5
+    assert report['repeated'] == [
+        {'statement': owner, 'parameters': '(1,)', 'count': 2}]
+    assert report['n_plus_one'] == [{'statement': owner, 'count': 4}]
+    assert report['slow'] == queries[:1]
+
+
+def test_reports_are_written_per_request(make_app, tmpdir):
+    reports = tmpdir.join('reports')
+    app = make_app(PROFILE_QUERIES=True, PROFILE_REPORT_DIR=str(reports),
+                   PROFILE_SLOW_QUERY_MS=0)
+    client = app.test_client()
+    headers = auth(register(client)['access_token'])
+    create_farm(client, headers)
+    assert client.get('/api/farms', headers=headers).status_code == 200
+
+    report = max(reports.listdir(), key=lambda path: path.basename)
+    report = json.loads(report.read())
+    assert (report['method'], report['path']) == ('GET', '/api/farms')
+    assert report['query_count'] == len(report['queries']) > 0
+    assert report['slow'] == report['queries']
+    assert all(entry['location'] for entry in report['queries'])
+    assert any(entry.get('explain') for entry in report['queries'])
+
+
+@pytest.mark.parametrize('budget, fails', [(1, True), (50, False)])
+def test_requests_over_the_budget_fail_tests(make_app, budget, fails):
+    app = make_app(PROFILE_QUERIES=True, PROFILE_QUERY_BUDGET=budget)
+    if fails:
+        with pytest.raises(QueryBudgetExceeded):
+            register(app.test_client())
+    else:
+        register(app.test_client())
+
+
+def test_failed_explain_keeps_the_transaction_usable(app):
+    with app.app_context():
+        conn = db.session.connection()
+        cursor = conn.connection.cursor()
+        plan = _explain(conn, cursor, 'SELECT * FROM no_such_table', ())
+        assert plan[0].startswith('EXPLAIN failed')
+        assert db.session.execute('SELECT 1').scalar() == 1
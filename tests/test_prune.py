@@ -0,0 +1,85 @@
+"""
+Pruning expired tokens in batches
+"""
+import threading
+from datetime import datetime, timedelta
+
+from app import db
+from app.cli import prune_tokens_command
+from app.helpers import count_expired_tokens, prune_database
+from app.models import TokenBlacklist, User
+from app.scheduler import PeriodicTask
+from tests.conftest import auth, register
+
+
+def add_tokens(expired, live):
+    now = datetime.now()
+    for i in range(expired + live):
+        expires = now + timedelta(days=-1 if i < expired else 1)
+        db.session.add(TokenBlacklist(
+            jti='jti-{}'.format(i), token_type='access',
+            user_identity='farmer@example.com', revoked=False,
+            expires=expires))
+    db.session.commit()
+
+
+def test_prune_deletes_expired_tokens_in_batches(app):
+    batches = []
+    with app.app_context():
+        add_tokens(expired=25, live=3)
+        deleted = prune_database(
+            batch_size=10, on_batch=lambda count, _: batches.append(count))
+        assert deleted == 25
+        assert batches == [10, 10, 5]
+        assert TokenBlacklist.query.count() == 3
+        assert count_expired_tokens() == 0
+
+
+def test_prune_stops_after_max_batches(app):
+    with app.app_context():
+        add_tokens(expired=25, live=0)
+        assert prune_database(batch_size=10, max_batches=2) == 20
+        assert count_expired_tokens() == 5
+
+
+def test_admin_endpoint_prunes_one_batch(make_app):
+    app = make_app(TOKEN_PRUNE_BATCH_SIZE=10)
+    client = app.test_client()
+    headers = auth(register(client)['access_token'])
+    with app.app_context():
+        User.query.one().admin = True
+        add_tokens(expired=15, live=0)
+
+    response = client.delete('/api/auth/tokens', headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['data'] == [{'deleted': 10, 'remaining': 5}]
+    response = client.delete('/api/auth/tokens', headers=headers)
+    assert response.get_json()['data'] == [{'deleted': 5, 'remaining': 0}]
+
+
+def test_cli_command(app):
+    with app.app_context():
+        add_tokens(expired=12, live=1)
+    result = app.test_cli_runner().invoke(prune_tokens_command,
+                                          ['--batch-size', '5'])
+    assert result.exit_code == 0
+    assert 'pruned 12 expired tokens' in result.output
+    with app.app_context():
+        assert TokenBlacklist.query.count() == 1
+
+
+def test_periodic_task_runs_in_an_app_context(app):
+    ran = threading.Event()
+
+    def task():
+        ran.set()
+        return count_expired_tokens()
+
+    periodic = PeriodicTask(app, 0.01, task, 'test-pruner')
+    periodic.start()
+    try:
+        assert ran.wait(5)
+    finally:
+        periodic.stop()
+        periodic.join(5)
+    assert not periodic.is_alive()
@@ -0,0 +1,67 @@
+"""
+The in-process cache of token revocation status
+"""
+import time
+
+from flask_jwt_extended import decode_token
+from sqlalchemy import event
+
+from app import db
+from app.cache import TTLCache
+from app.helpers import is_token_revoked
+from tests.conftest import auth, register
+
+
+def test_entries_expire_with_the_given_deadline():
+    cache = TTLCache(ttl=60)
+    cache.set('live', False, expires_at=time.time() + 60)
+    cache.set('expired', False, expires_at=time.time() - 1)
+    assert cache.get('live') is False
+    assert cache.get('expired') is None
+    assert cache.stats['hits'] == 1
+    assert cache.stats['misses'] == 1
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = TTLCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+
+
+def test_disabled_cache_stores_nothing():
+    cache = TTLCache(enabled=False)
+    cache.set('a', 1)
+    assert cache.get('a') is None
+
+
+def test_revocation_status_is_read_once(make_app):
+    app = make_app(REVOCATION_CACHE_ENABLED=True)
+    token = register(app.test_client())['access_token']
+    with app.app_context():
+        decoded = decode_token(token)
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            if 'token_blacklist' in statement:
+                statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            assert is_token_revoked(decoded) is False
+            assert is_token_revoked(decoded) is False
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+    assert len(statements) == 1
+
+
+def test_logout_invalidates_the_cached_status(make_app):
+    app = make_app(REVOCATION_CACHE_ENABLED=True)
+    client = app.test_client()
+    headers = auth(register(client)['access_token'])
+    assert client.get('/api/farms', headers=headers).status_code == 200
+    assert client.post('/api/auth/logout', headers=headers).status_code == 200
+    assert client.get('/api/farms', headers=headers).status_code == 401
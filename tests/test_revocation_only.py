@@ -0,0 +1,39 @@
+"""
+The revocation-only token store mode and its Bloom filter
+"""
+from app.bloom import BloomFilter
+from app.models import TokenBlacklist
+from tests.conftest import auth, register
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    keys = ['jti-{}'.format(i) for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    assert len(bloom) == 1000
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add('jti-{}'.format(i))
+    false_positives = sum('other-{}'.format(i) in bloom
+                          for i in range(10000))
+    assert false_positives < 300
+
+
+def test_only_revoked_tokens_are_stored(make_app):
+    app = make_app(TOKEN_STORE_MODE='revoked', TOKEN_BLOOM_REFRESH=0)
+    client = app.test_client()
+    headers = auth(register(client)['access_token'])
+    with app.app_context():
+        assert TokenBlacklist.query.count() == 0
+    assert client.get('/api/farms', headers=headers).status_code == 200
+
+    assert client.post('/api/auth/logout', headers=headers).status_code == 200
+    with app.app_context():
+        tokens = TokenBlacklist.query.all()
+        assert [token.revoked for token in tokens] == [True]
+    assert client.get('/api/farms', headers=headers).status_code == 401
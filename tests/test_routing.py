@@ -0,0 +1,51 @@
+"""
+Routing of reads to the replicas
+"""
+import shutil
+
+import pytest
+
+from tests.conftest import auth, create_farm, register
+
+
+@pytest.fixture
+def replicated(make_app, tmpdir):
+    """
+    An application on a SQLite primary whose replica is a copy of the
+    primary taken after a user registered, and that user's headers
+    """
+    primary = tmpdir.join('primary.sqlite')
+    replica = tmpdir.join('replica.sqlite')
+    app = make_app(SQLALCHEMY_DATABASE_URI='sqlite:///' + str(primary),
+                   SQLALCHEMY_REPLICA_URIS=['sqlite:///' + str(replica)])
+    headers = auth(register(app.test_client())['access_token'])
+    shutil.copy(str(primary), str(replica))
+    return app, headers
+
+
+def names(client, headers):
+    response = client.get('/api/farms', headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return [farm['name'] for farm in response.get_json()['data']]
+
+
+def test_reads_go_to_the_replica(replicated):
+    app, headers = replicated
+    create_farm(app.test_client(), headers)
+    # the replica never sees the write
+    assert names(app.test_client(), headers) == []
+
+
+def test_writers_read_from_the_primary(replicated):
+    app, headers = replicated
+    client = app.test_client()
+    create_farm(client, headers)
+    assert names(client, headers) == ['Hillside farm']
+
+
+def test_revocation_is_checked_on_the_primary(replicated):
+    app, headers = replicated
+    response = app.test_client().post('/api/auth/logout', headers=headers)
+    assert response.status_code == 200
+    response = app.test_client().get('/api/farms', headers=headers)
+    assert response.status_code == 401
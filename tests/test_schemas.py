@@ -0,0 +1,66 @@
+"""
+Request payload schemas
+"""
+import pytest
+from flask import Flask
+
+from app.api.common.schemas import MISSING_MESSAGE, Schema
+from app.exceptions import InvalidPayload
+from tests.conftest import register
+
+SCHEMA = Schema([('name', str), ('units', int), ('active', bool)])
+
+
+@pytest.fixture
+def context():
+    app = Flask(__name__)
+
+    def make(*args, **kwargs):
+        return app.test_request_context(*args, **kwargs)
+    return make
+
+
+def test_fields_not_given_are_none(context):
+    with context(json={'name': 'Hillside'}):
+        assert SCHEMA.parse() == {'name': 'Hillside', 'units': None,
+                                  'active': None}
+
+
+def test_values_are_converted(context):
+    with context(json={'name': 7, 'units': '12', 'active': 1}):
+        assert SCHEMA.parse() == {'name': '7', 'units': 12, 'active': True}
+    with pytest.raises(InvalidPayload):
+        with context(json={'units': 'twelve'}):
+            SCHEMA.parse()
+
+
+def test_body_comes_before_the_query_string(context):
+    with context('/?name=query&units=3', json={'name': ['body', 'other']}):
+        assert SCHEMA.parse() == {'name': 'body', 'units': 3,
+                                  'active': None}
+
+
+def test_required_and_unknown_fields(context):
+    schema = Schema([('units', str)], required=['units'], strict=True)
+    with context(json={}):
+        with pytest.raises(InvalidPayload) as error:
+            schema.parse()
+    assert str(error.value) == MISSING_MESSAGE
+    with context(json={'units': '3', 'name': 'x'}):
+        with pytest.raises(InvalidPayload) as error:
+            schema.parse()
+    assert str(error.value) == 'Unknown arguments: name'
+    # unknown fields are ignored unless the schema is strict
+    assert SCHEMA.load({'units': 3, 'owner': 'x'})['units'] == 3
+
+
+def test_load_keeps_arrays():
+    schema = Schema([('tags', tuple)])
+    assert schema.load({'tags': ['a', 'b']}) == {'tags': ('a', 'b')}
+
+
+def test_endpoints_read_the_query_string(client):
+    register(client)
+    response = client.post(
+        '/api/auth/login?email=farmer@example.com&password=Passw0rd!')
+    assert response.status_code == 200
@@ -0,0 +1,50 @@
+"""
+Full-text search over farm names and descriptions
+"""
+from tests.conftest import create_farm
+
+
+def search(client, headers, query):
+    response = client.get('/api/farms?' + query, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return [farm['name'] for farm in response.get_json()['data']]
+
+
+def test_every_word_must_match(client, headers):
+    create_farm(client, headers, name='Hillside', description='maize beans')
+    create_farm(client, headers, name='Riverside', description='tea')
+    create_farm(client, headers, name='Tea estate', description='maize')
+    assert sorted(search(client, headers, 'filter[q]=maize')) == \
+        ['Hillside', 'Tea estate']
+    assert search(client, headers, 'filter[q]=maize tea') == ['Tea estate']
+    assert search(client, headers, 'filter[q]=coffee') == []
+
+
+def test_words_are_stemmed(client, headers):
+    create_farm(client, headers, name='Hillside', description='growing beans')
+    assert search(client, headers, 'filter[q]=grows bean') == ['Hillside']
+
+
+def test_most_relevant_first(client, headers):
+    create_farm(client, headers, name='Hillside',
+                description='maize, sorghum and millet on rolling hills')
+    create_farm(client, headers, name='Maize farm',
+                description='maize and more maize')
+    assert search(client, headers, 'filter[q]=maize')[0] == 'Maize farm'
+    assert search(client, headers, 'filter[q]=maize&sort=name') == \
+        ['Hillside', 'Maize farm']
+
+
+def test_search_follows_updates_and_deletes(client, headers):
+    farm = create_farm(client, headers, name='Hillside', description='tea')
+    path = '/api/farms/{}'.format(farm['id'])
+    client.patch(path, headers=headers, json={'description': 'coffee'})
+    assert search(client, headers, 'filter[q]=tea') == []
+    assert search(client, headers, 'filter[q]=coffee') == ['Hillside']
+    client.delete(path, headers=headers)
+    assert search(client, headers, 'filter[q]=coffee') == []
+
+
+def test_query_without_words(client, headers):
+    response = client.get('/api/farms?filter[q]=...', headers=headers)
+    assert response.status_code == 400
@@ -0,0 +1,59 @@
+"""
+Columnar serialization of farm collections and their JSON encoding
+"""
+import json
+from datetime import datetime
+
+from app import db
+from app.api.common.serialization import dumps
+from app.api.farms import FARM_COLUMNS
+from app.models import Farm
+from tests.conftest import create_farm
+
+
+def test_rows_serialize_as_farms_do(app, client, headers):
+    create_farm(client, headers, latitude='-0.3', longitude='36.07')
+    with app.app_context():
+        farm = Farm.query.one()
+        farm.harvest_time = datetime(2027, 3, 1)
+        farm.createdon = datetime(2026, 10, 18, 21, 5)
+        farm.margin = 12.5
+        db.session.commit()
+        rows = FARM_COLUMNS.query().all()
+        assert FARM_COLUMNS.serialize(rows) == [farm.serialize]
+
+
+def test_dates_of_many_rows(app, client, headers):
+    for i in range(3):
+        create_farm(client, headers, name='Farm {}'.format(i))
+    with app.app_context():
+        for hour, farm in zip((0, 12, 23), Farm.query.order_by(Farm.id)):
+            farm.createdon = datetime(2026, 10, 18, hour, 30)
+        db.session.commit()
+        rows = FARM_COLUMNS.query().order_by(Farm.id).all()
+        serialized = FARM_COLUMNS.serialize(rows)
+        farms = Farm.query.order_by(Farm.id).all()
+        assert serialized == [farm.serialize for farm in farms]
+
+
+def test_dumps_is_compact_utf8():
+    data = {'name': 'Shamba la Nyabururu', 'units': [1, 2.5, None],
+            'owner': 'Wanjikũ'}
+    assert dumps(data) == json.dumps(
+        data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def test_dumps_numbers_the_json_module_writes_differently():
+    assert dumps([1e16, float('nan'), float('inf')]) == b'[1e+16,null,null]'
+    assert dumps([2 ** 70]) == str([2 ** 70]).replace(' ', '').encode()
+
+
+def test_only_collections_are_compact(client, headers):
+    create_farm(client, headers)
+    collection = client.get('/api/farms', headers=headers)
+    assert collection.mimetype == 'application/json'
+    assert collection.get_data().startswith(b'{"status":200,"data":[{')
+
+    farm = client.get('/api/farms/1', headers=headers)
+    assert farm.mimetype == 'application/json'
+    assert farm.get_data().startswith(b'{"status": 200, ')
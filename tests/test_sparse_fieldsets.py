@@ -0,0 +1,47 @@
+"""
+JSON:API sparse fieldsets on farms
+"""
+from sqlalchemy import event
+
+from app import db
+from tests.conftest import create_farm
+
+
+def test_only_requested_fields_are_returned(client, headers):
+    farm = create_farm(client, headers)
+    response = client.get('/api/farms?fields[farms]=name,units',
+                          headers=headers)
+    assert response.get_json()['data'] == [
+        {'id': farm['id'], 'name': farm['name'], 'units': farm['units']}]
+
+    response = client.get('/api/farms/{}?fields[farms]=stage'.format(
+        farm['id']), headers=headers)
+    assert response.get_json()['data'] == [
+        {'id': farm['id'], 'stage': 'closed'}]
+
+
+def test_only_requested_columns_are_read(app, client, headers):
+    create_farm(client, headers)
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if 'FROM farms' in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        client.get('/api/farms?fields[farms]=name', headers=headers)
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', record)
+    select = statements[-1].split('FROM farms')[0]
+    assert 'farms.name' in select
+    assert 'farms.description' not in select
+    assert 'farms.location' not in select
+
+
+def test_unknown_field(client, headers):
+    response = client.get('/api/farms?fields[farms]=name,colour',
+                          headers=headers)
+    assert response.status_code == 400
@@ -0,0 +1,101 @@
+"""
+Issuing tokens in the request's transaction, and writing them behind
+"""
+import time
+
+from flask import Flask
+from flask_jwt_extended import decode_token
+
+from app.helpers import _token_claims, token_writer
+from app.models import TokenBlacklist
+from app.writebehind import TokenWriter
+from tests.conftest import auth, register
+
+
+def writer_app():
+    app = Flask(__name__)
+    app.config.update(TOKEN_WRITE_BEHIND=False, TOKEN_WRITE_BEHIND_BATCH=100,
+                      TOKEN_WRITE_BEHIND_DELAY=0.05,
+                      TOKEN_WRITE_BEHIND_GRACE=10)
+    return app
+
+
+def row(jti):
+    return {'jti': jti, 'revoked': False}
+
+
+def test_claims_are_read_without_decoding(app, client):
+    tokens = register(client)
+    with app.app_context():
+        for name in ('access_token', 'refresh_token'):
+            claims = _token_claims(tokens[name])
+            decoded = decode_token(tokens[name])
+            for claim in ('jti', 'type', 'identity', 'exp', 'iat'):
+                assert claims[claim] == decoded[claim]
+
+
+def test_signup_stores_both_tokens(app, client):
+    tokens = register(client)
+    with app.app_context():
+        stored = dict((token.jti, token.token_type)
+                      for token in TokenBlacklist.query)
+        assert stored == {
+            decode_token(tokens['access_token'])['jti']: 'access',
+            decode_token(tokens['refresh_token'])['jti']: 'refresh',
+        }
+
+
+def test_queued_tokens_are_written_in_one_batch():
+    batches = []
+    writer = TokenWriter(batches.append)
+    writer.init_app(writer_app())
+    for i in range(5):
+        writer.put(row('jti-{}'.format(i)))
+    writer.flush()
+    assert [len(batch) for batch in batches] == [5]
+
+
+def test_failed_batch_is_retried_row_by_row():
+    written = []
+
+    def write(rows):
+        if any(row['jti'] == 'bad' for row in rows):
+            raise ValueError('conflict')
+        written.extend(row['jti'] for row in rows)
+
+    writer = TokenWriter(write)
+    writer.init_app(writer_app())
+    for jti in ('a', 'bad', 'b'):
+        writer.put(row(jti))
+    writer.flush()
+    assert written == ['a', 'b']
+
+
+def test_revoked_while_queued_is_written_revoked():
+    batches = []
+    writer = TokenWriter(batches.append)
+    writer.init_app(writer_app())
+    writer.put(row('a'))
+    assert writer.revoke('a')
+    assert not writer.revoke('unknown')
+    writer.flush()
+    assert batches == [[{'jti': 'a', 'revoked': True}]]
+
+
+def test_logout_while_queued(make_app):
+    app = make_app(TOKEN_WRITE_BEHIND=True, TOKEN_WRITE_BEHIND_DELAY=0.2)
+    client = app.test_client()
+    tokens = register(client)
+    headers = auth(tokens['access_token'])
+    # accepted before it is written
+    assert client.get('/api/farms', headers=headers).status_code == 200
+    assert client.post('/api/auth/logout', headers=headers).status_code == 200
+
+    deadline = time.time() + 5
+    while token_writer._pending and time.time() < deadline:
+        time.sleep(0.01)
+    with app.app_context():
+        stored = dict((token.token_type, token.revoked)
+                      for token in TokenBlacklist.query)
+    assert stored == {'access': True, 'refresh': False}
+    assert client.get('/api/farms', headers=headers).status_code == 401
@@ -0,0 +1,68 @@
+"""
+Sharing user lookups within a request and, with the user cache, across
+requests
+"""
+import contextlib
+
+from sqlalchemy import event
+
+from app import db
+from app.models import User
+from tests.conftest import auth, register
+
+
+@contextlib.contextmanager
+def user_queries(app):
+    """
+    Collects the statements run against the users table
+    """
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if statement.startswith('SELECT') and 'FROM users' in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def make_admin(app, admin=True):
+    with app.app_context():
+        User.query.filter_by(email='farmer@example.com').one().admin = admin
+        db.session.commit()
+
+
+def test_one_lookup_per_request(app, client, headers):
+    make_admin(app)
+    with user_queries(app) as statements:
+        # the user loader and admin_required both need the user
+        assert client.get('/api/metrics', headers=headers).status_code == 200
+    assert len(statements) == 1
+
+
+def test_cached_across_requests(make_app):
+    app = make_app(USER_CACHE_ENABLED=True)
+    client = app.test_client()
+    headers = auth(register(client)['access_token'])
+    make_admin(app)
+    with user_queries(app) as statements:
+        for _ in range(3):
+            assert client.get('/api/metrics',
+                              headers=headers).status_code == 200
+    assert len(statements) == 1
+
+
+def test_updating_a_user_invalidates_the_cache(make_app):
+    app = make_app(USER_CACHE_ENABLED=True)
+    client = app.test_client()
+    headers = auth(register(client)['access_token'])
+    assert client.get('/api/metrics', headers=headers).status_code == 403
+    make_admin(app)
+    assert client.get('/api/metrics', headers=headers).status_code == 200
+    make_admin(app, False)
+    assert client.get('/api/metrics', headers=headers).status_code == 403